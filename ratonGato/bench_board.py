@@ -0,0 +1,67 @@
+# Micro-benchmark del dibujo del tablero
+# Compara los tableros dibujados por segundo con la plantilla
+# mouse_cat/board.html (el bucle que antes estaba en game.html) y con el
+# dibujo precompilado de logic/board_html.py, para posiciones al azar.
+#
+# Uso: python bench_board.py [n_posiciones]
+
+import os
+import random
+import sys
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ratonGato.settings')
+django.setup()
+
+from django.template.loader import get_template  # noqa: E402
+
+from datamodel import rules  # noqa: E402
+from logic import board_html  # noqa: E402
+
+
+def random_boards(n, seed=0):
+    rnd = random.Random(seed)
+    dark = rules.cells(rules.DARK)
+    boards = []
+    for _ in range(n):
+        board = [0]*64
+        pieces = rnd.sample(dark, 5)
+        for cat in pieces[:4]:
+            board[cat] = 1
+        board[pieces[4]] = -1
+        boards.append(board)
+    return boards
+
+
+def bench(label, fn, boards):
+    start = time.perf_counter()
+    for board in boards:
+        fn(board)
+    elapsed = time.perf_counter() - start
+    rate = len(boards) / elapsed
+    print("%-8s %10.0f boards/s" % (label, rate))
+    return rate
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    boards = random_boards(n)
+    template = get_template('mouse_cat/board.html')
+
+    def render_template(board):
+        return template.render({'board': board})
+
+    # Las dos versiones deben dar el mismo HTML
+    for board in boards:
+        if render_template(board) != board_html.render(board):
+            print("Mismatch:", board)
+
+    loop = bench("template", render_template, boards)
+    compiled = bench("compiled", board_html.render, boards)
+    print("speedup  %10.2fx" % (compiled / loop))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# Micro-benchmark del motor de reglas (datamodel/rules.py)
+# Compara los movimientos validados por segundo con la validacion
+# anterior basada en listas y ramas if/elif (reproducida aqui tal cual
+# se hacia en Move.save y Move.actualizarMove).
+#
+# Tambien mide la validacion vectorizada de datamodel/batch.py.
+#
+# Uso: python bench_rules.py [n_posiciones]
+
+import random
+import sys
+import time
+
+import numpy as np
+
+from datamodel import batch, rules
+
+MIN_CELL = 0
+MAX_CELL = 63
+
+
+class LegacyGame:
+    # Imita las casillas de Game, que se recalculaban en cada comprobacion
+    def __init__(self, cats, mouse):
+        self.cat1, self.cat2, self.cat3, self.cat4 = cats
+        self.mouse = mouse
+
+    def pos_gatos(self):
+        return [int(self.cat1), int(self.cat2), int(self.cat3), int(self.cat4)]
+
+    def pos_raton(self):
+        return [int(self.mouse)]
+
+
+def legacy_is_legal(game, cat_turn, origin, target):
+    derecha_arriba = origin - 7
+    izquierda_arriba = origin - 9
+    derecha_abajo = origin + 9
+    izquierda_abajo = origin + 7
+
+    mov_gato = [derecha_abajo, izquierda_abajo]
+    mov_raton = [derecha_arriba, izquierda_arriba,
+                 derecha_abajo, izquierda_abajo]
+
+    if ((target in game.pos_gatos())
+            or (target in game.pos_raton())):
+        return False
+    if not (MIN_CELL <= target <= MAX_CELL):
+        return False
+
+    if cat_turn:
+        if (origin % 8) == 0:
+            valid = target == derecha_abajo
+        elif (origin % 8) == 7:
+            valid = target == izquierda_abajo
+        else:
+            valid = target in mov_gato
+        return valid and origin in game.pos_gatos()
+    else:
+        if (origin % 8) == 0:
+            valid = target in (derecha_abajo, derecha_arriba)
+        elif (origin % 8) == 7:
+            valid = target in (izquierda_abajo, izquierda_arriba)
+        else:
+            valid = target in mov_raton
+        return valid and origin in game.pos_raton()
+
+
+def random_positions(n, seed=0):
+    rnd = random.Random(seed)
+    dark = rules.cells(rules.DARK)
+    positions = []
+    for _ in range(n):
+        pieces = rnd.sample(dark, 5)
+        cat_turn = rnd.random() < 0.5
+        if cat_turn:
+            origin = rnd.choice(pieces[:4])
+        else:
+            origin = pieces[4]
+        target = origin + rnd.choice((-9, -7, 7, 9))
+        positions.append((pieces[:4], pieces[4], cat_turn, origin, target))
+    return positions
+
+
+def bench(label, fn, positions):
+    start = time.perf_counter()
+    for args in positions:
+        fn(*args)
+    elapsed = time.perf_counter() - start
+    rate = len(positions) / elapsed
+    print("%-8s %10.0f moves/s" % (label, rate))
+    return rate
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    positions = random_positions(n)
+    games = [(LegacyGame(cats, mouse), cat_turn, origin, target)
+             for cats, mouse, cat_turn, origin, target in positions]
+    states = [(rules.make_state(cats, mouse, cat_turn), (origin, target))
+              for cats, mouse, cat_turn, origin, target in positions]
+
+    # Las dos implementaciones deben estar de acuerdo
+    for legacy_args, rules_args in zip(games, states):
+        if legacy_is_legal(*legacy_args) != rules.is_legal(*rules_args):
+            print("Mismatch:", legacy_args[1:], rules_args)
+
+    legacy = bench("legacy", legacy_is_legal, games)
+    engine = bench("rules", rules.is_legal, states)
+    print("speedup  %10.2fx" % (engine / legacy))
+
+    # Validacion vectorizada de todas las posiciones de una vez
+    columns = [np.asarray(column) for column in zip(*positions)]
+    start = time.perf_counter()
+    batch.validate_moves(*columns)
+    rate = n / (time.perf_counter() - start)
+    print("%-8s %10.0f moves/s" % ("batch", rate))
+
+
+if __name__ == '__main__':
+    main()
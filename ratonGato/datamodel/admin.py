@@ -4,7 +4,13 @@ from django.contrib import admin
 from datamodel.models import Game
 from datamodel.models import Move
 from datamodel.models import Counter
+from datamodel.models import GameSnapshot
+from datamodel.models import ArchivedGame
+from datamodel.models import PlayerStats
 
 admin.site.register(Move)
 admin.site.register(Game)
 admin.site.register(Counter)
+admin.site.register(GameSnapshot)
+admin.site.register(ArchivedGame)
+admin.site.register(PlayerStats)
@@ -0,0 +1,214 @@
+# Jugador automatico: busqueda alfa-beta (negamax) con profundizacion
+# iterativa, tabla de transposiciones indexada por hash Zobrist,
+# ordenacion de movimientos y un presupuesto de tiempo estricto por
+# movimiento para no bloquear nunca al proceso que atiende la peticion.
+# La tabla de transposiciones es unica por proceso y de tamano fijo, asi
+# que se aprovecha de un movimiento al siguiente sin crecer sin limite.
+
+import time
+
+from datamodel import rules, termination, zobrist
+from datamodel.board import BOARD, MOUSE_MASKS
+
+MATE = 10000
+INFINITY = MATE + 1
+MAX_DEPTH = 64
+TT_SIZE = 1 << 18       # potencia de 2
+CHECK_EVERY = 1024      # nodos entre comprobaciones del reloj
+
+# Tipos de entrada de la tabla de transposiciones
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+class Timeout(Exception):
+    pass
+
+
+def _is_mate(score):
+    return abs(score) >= MATE - MAX_DEPTH
+
+
+class TranspositionTable:
+    # Una entrada por hueco (indexado por los bits bajos del hash); la
+    # nueva sustituye a la que hubiera, asi que nunca pasa de 'size'
+    # entradas. Escribir un hueco de la lista es atomico, de modo que los
+    # hilos del proceso la comparten sin cerrojo: en el peor caso se
+    # pierde una entrada.
+    # Las puntuaciones de mate se guardan como distancia al mate desde el
+    # nodo y no desde la raiz, para que sirvan desde cualquier ply.
+
+    def __init__(self, size=TT_SIZE):
+        self.mask = size - 1
+        self.slots = [None]*size
+
+    def probe(self, key, ply):
+        # (depth, score, flag, move) o None
+        entry = self.slots[key & self.mask]
+        if entry is None or entry[0] != key:
+            return None
+        _, depth, score, flag, move = entry
+        if _is_mate(score):
+            score -= ply if score > 0 else -ply
+        return depth, score, flag, move
+
+    def store(self, key, ply, depth, score, flag, move):
+        if _is_mate(score):
+            score += ply if score > 0 else -ply
+        self.slots[key & self.mask] = (key, depth, score, flag, move)
+
+    def clear(self):
+        self.slots = [None]*len(self.slots)
+
+
+TABLE = TranspositionTable()
+
+
+def escape_distance(state):
+    # Movimientos minimos del raton (sin que los gatos muevan) para
+    # ponerse a la altura del gato mas adelantado, o None si no puede
+    first_cat_row = ((state.cats & -state.cats).bit_length() - 1) // BOARD
+    free = ~state.cats
+    reached = frontier = state.mouse
+    distance = 0
+    while frontier:
+        for cell in rules.cells(frontier):
+            if cell // BOARD <= first_cat_row:
+                return distance
+        expand = 0
+        for cell in rules.cells(frontier):
+            expand |= MOUSE_MASKS[cell]
+        frontier = expand & free & ~reached
+        reached |= frontier
+        distance += 1
+    return None
+
+
+def evaluate(state):
+    # Valoracion heuristica desde el punto de vista del bando que mueve
+    escape = escape_distance(state)
+    if escape is None:
+        # El raton esta encerrado detras de la linea de gatos
+        score = 500
+    else:
+        score = 20*escape
+
+    # Los gatos deben avanzar en linea, sin dejar huecos
+    rows = [c // BOARD for c in rules.cells(state.cats)]
+    score -= 4*(max(rows) - min(rows))
+
+    # Movilidad del raton
+    mouse = state.mouse.bit_length() - 1
+    score -= 3*bin(MOUSE_MASKS[mouse] & ~state.cats).count('1')
+
+    return score if state.cat_turn else -score
+
+
+def _order_key(state, mouse):
+    # Primero los movimientos del raton hacia arriba y los de los gatos
+    # que se acercan al raton
+    if state.cat_turn:
+        return lambda move: abs(move[1] - mouse)
+    return lambda move: move[1]
+
+
+class Searcher:
+
+    def __init__(self, time_budget=0.5, max_depth=MAX_DEPTH, tt=None):
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.tt = TABLE if tt is None else tt
+        self.nodes = 0
+        self.depth = 0
+
+    def choose(self, state):
+        # Devuelve el mejor movimiento encontrado dentro del presupuesto
+        side = rules.CAT if state.cat_turn else rules.MOUSE
+        moves = rules.legal_moves(state, side)
+        if not moves:
+            return None
+
+        self.deadline = time.perf_counter() + self.time_budget
+        self.nodes = 0
+
+        key = zobrist.hash_state(state)
+        best = self.root_move = moves[0]
+        for depth in range(1, self.max_depth + 1):
+            try:
+                score = self._negamax(state, key, depth, -INFINITY,
+                                      INFINITY, 0)
+            except Timeout:
+                break
+            # Otro hilo puede haber reutilizado ya el hueco de la raiz
+            best = self.root_move
+            self.depth = depth
+            # Resultado forzado: no hace falta profundizar mas
+            if abs(score) > MATE - MAX_DEPTH:
+                break
+        return best
+
+    def _negamax(self, state, key, depth, alpha, beta, ply):
+        self.nodes += 1
+        if (self.nodes % CHECK_EVERY == 0
+                and time.perf_counter() > self.deadline):
+            raise Timeout()
+
+        winner = termination.winner(state)
+        if winner is not None:
+            side = rules.CAT if state.cat_turn else rules.MOUSE
+            return MATE - ply if winner == side else ply - MATE
+        if depth == 0:
+            return evaluate(state)
+
+        alpha_orig = alpha
+        tt_move = None
+        entry = self.tt.probe(key, ply)
+        if entry is not None:
+            tt_depth, tt_score, tt_flag, tt_move = entry
+            # En la raiz siempre se busca, para conocer el mejor movimiento
+            if tt_depth >= depth and ply > 0:
+                if tt_flag == EXACT:
+                    return tt_score
+                if tt_flag == LOWER:
+                    alpha = max(alpha, tt_score)
+                elif tt_flag == UPPER:
+                    beta = min(beta, tt_score)
+                if alpha >= beta:
+                    return tt_score
+
+        side = rules.CAT if state.cat_turn else rules.MOUSE
+        moves = rules.legal_moves(state, side)
+        moves.sort(key=_order_key(state, state.mouse.bit_length() - 1))
+        if tt_move in moves:
+            moves.remove(tt_move)
+            moves.insert(0, tt_move)
+
+        best_score = -INFINITY
+        best_move = moves[0]
+        for move in moves:
+            child = rules.apply(state, move)
+            child_key = zobrist.update(key, state, move)
+            score = -self._negamax(child, child_key, depth - 1,
+                                   -beta, -alpha, ply + 1)
+            if score > best_score:
+                best_score = score
+                best_move = move
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+
+        if best_score <= alpha_orig:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.store(key, ply, depth, best_score, flag, best_move)
+        if ply == 0:
+            self.root_move = best_move
+        return best_score
+
+
+def choose_move(state, time_budget=0.5):
+    return Searcher(time_budget).choose(state)
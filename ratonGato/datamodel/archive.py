@@ -0,0 +1,82 @@
+# Archivo de partidas terminadas.
+# Las partidas FINISHED que terminaron antes de una fecha pasan, en lotes,
+# de Game/Move/GameSnapshot a ArchivedGame, con todos sus movimientos en
+# un unico campo comprimido. Asi las tablas en uso solo contienen las
+# partidas vivas y sus indices caben en memoria. Cada lote se copia y se
+# borra en la misma transaccion, y despues se descartan sus canales de
+# avisos.
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from datamodel import movelog, pubsub
+from datamodel.models import ArchivedGame, Game, GameStatus, Move
+
+CHUNK_SIZE = 500
+
+
+def archivable(before):
+    # Partidas que se pueden archivar (indice finished_games)
+    return Game.objects.filter(status=GameStatus.FINISHED,
+                               finished_at__lt=before)
+
+
+def default_cutoff():
+    return timezone.now() - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+
+
+def archive_chunk(game_ids, before):
+    # Archiva las partidas indicadas que sigan siendo archivables;
+    # devuelve cuantas se han archivado
+    ids = _archive_chunk(game_ids, before)
+    for game_id in ids:
+        pubsub.discard(Game.channel(game_id))
+    return len(ids)
+
+
+@transaction.atomic
+def _archive_chunk(game_ids, before):
+    # Devuelve los ids archivados
+    games = list(archivable(before).filter(id__in=game_ids))
+    if not games:
+        return []
+
+    ids = [game.id for game in games]
+    moves = {game_id: [] for game_id in ids}
+    for game_id, origin, target in (Move.objects.filter(game_id__in=ids)
+                                    .order_by('game_id', 'id')
+                                    .values_list('game_id', 'origin',
+                                                 'target')):
+        moves[game_id].append((origin, target))
+    for game in games:
+        # Movimientos del registro empaquetado, detras de las filas
+        moves[game.id].extend((origin, target) for origin, target, _, _
+                              in movelog.entries(game.move_log))
+
+    ArchivedGame.objects.bulk_create([
+        ArchivedGame(id=game.id, cat_user_id=game.cat_user_id,
+                     mouse_user_id=game.mouse_user_id, winner=game.winner,
+                     packed_state=game.packed_state,
+                     move_count=len(moves[game.id]),
+                     move_log=movelog.encode(moves[game.id]),
+                     finished_at=game.finished_at)
+        for game in games])
+    # Borra tambien sus movimientos y fotos (on_delete=CASCADE)
+    Game.objects.filter(id__in=ids).delete()
+    return ids
+
+
+def archive_finished(before=None, chunk_size=CHUNK_SIZE):
+    # Archiva todas las partidas terminadas antes de 'before'
+    if before is None:
+        before = default_cutoff()
+    total = 0
+    while True:
+        ids = list(archivable(before).order_by('id')
+                   .values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return total
+        total += archive_chunk(ids, before)
@@ -0,0 +1,51 @@
+# Validacion vectorizada de movimientos de muchas partidas a la vez.
+# Cada fila es una partida independiente; todas las comprobaciones son
+# consultas a las tablas del tablero hechas con NumPy, sin bucles Python
+# ni accesos a la base de datos.
+
+import numpy as np
+
+from datamodel import board
+
+# CAT_TARGET[o, t] es True si un gato puede ir de o a t (igual el raton)
+CAT_TARGET = np.zeros((board.N_CELLS, board.N_CELLS), dtype=bool)
+MOUSE_TARGET = np.zeros((board.N_CELLS, board.N_CELLS), dtype=bool)
+for _cell in range(board.N_CELLS):
+    CAT_TARGET[_cell, list(board.CAT_TARGETS[_cell])] = True
+    MOUSE_TARGET[_cell, list(board.MOUSE_TARGETS[_cell])] = True
+CAT_TARGET.setflags(write=False)
+MOUSE_TARGET.setflags(write=False)
+
+
+def validate_moves(cats, mouse, cat_turn, origin, target):
+    # cats: (n, 4) casillas de los gatos; mouse, cat_turn, origin y
+    # target: (n,). Devuelve (legal, cats, mouse, cat_turn) con la
+    # posicion resultante; las filas no legales se devuelven sin cambios
+    cats = np.asarray(cats, dtype=np.int64).reshape(-1, 4)
+    mouse = np.asarray(mouse, dtype=np.int64)
+    cat_turn = np.asarray(cat_turn, dtype=bool)
+    origin = np.asarray(origin, dtype=np.int64)
+    target = np.asarray(target, dtype=np.int64)
+
+    in_range = ((origin >= board.MIN_CELL) & (origin <= board.MAX_CELL)
+                & (target >= board.MIN_CELL) & (target <= board.MAX_CELL))
+    # Indices recortados para poder consultar las tablas en todas las filas
+    o = np.clip(origin, board.MIN_CELL, board.MAX_CELL)
+    t = np.clip(target, board.MIN_CELL, board.MAX_CELL)
+
+    cat_at_origin = cats == origin[:, None]
+    own_piece = np.where(cat_turn, cat_at_origin.any(axis=1),
+                         mouse == origin)
+    reachable = np.where(cat_turn, CAT_TARGET[o, t], MOUSE_TARGET[o, t])
+    occupied = (cats == target[:, None]).any(axis=1) | (mouse == target)
+
+    legal = in_range & own_piece & reachable & ~occupied
+
+    # Posiciones resultantes: se mueve el primer gato de la casilla origen
+    new_cats = cats.copy()
+    rows = np.nonzero(legal & cat_turn)[0]
+    new_cats[rows, cat_at_origin[rows].argmax(axis=1)] = target[rows]
+    new_mouse = np.where(legal & ~cat_turn, target, mouse)
+    new_cat_turn = np.where(legal, ~cat_turn, cat_turn)
+
+    return legal, new_cats, new_mouse, new_cat_turn
@@ -0,0 +1,50 @@
+# Tablas precalculadas e inmutables del tablero de 8x8.
+# Todas se indexan por casilla (0..63) y tienen en cuenta los bordes de
+# las columnas 0 y 7, de modo que cualquier comprobacion de las reglas
+# es una consulta O(1).
+
+BOARD = 8               # numero de casillas por fila y columna
+MIN_CELL = 0
+MAX_CELL = BOARD*BOARD - 1
+N_CELLS = BOARD*BOARD
+
+
+def _destinos(casilla, filas):
+    # Casillas diagonales de 'casilla' en las filas indicadas
+    # (+1 hacia abajo, -1 hacia arriba) sin salirse del tablero
+    fila, columna = divmod(casilla, BOARD)
+    res = []
+    for df in filas:
+        for dc in (-1, 1):
+            f, c = fila + df, columna + dc
+            if 0 <= f < BOARD and 0 <= c < BOARD:
+                res.append(f*BOARD + c)
+    return tuple(sorted(res))
+
+
+def _mascara(casillas):
+    mascara = 0
+    for casilla in casillas:
+        mascara |= 1 << casilla
+    return mascara
+
+
+# IS_DARK[c] es True si la casilla c es valida de juego (oscura)
+IS_DARK = tuple(sum(divmod(c, BOARD)) % 2 == 0 for c in range(N_CELLS))
+DARK_CELLS = frozenset(c for c in range(N_CELLS) if IS_DARK[c])
+DARK_MASK = _mascara(DARK_CELLS)
+
+# Destinos posibles desde cada casilla: los gatos solo avanzan hacia
+# abajo, el raton se mueve en las 4 diagonales
+CAT_TARGETS = tuple(_destinos(c, (1,)) for c in range(N_CELLS))
+MOUSE_TARGETS = tuple(_destinos(c, (-1, 1)) for c in range(N_CELLS))
+
+# Los mismos destinos como mascaras de 64 bits
+CAT_MASKS = tuple(_mascara(t) for t in CAT_TARGETS)
+MOUSE_MASKS = tuple(_mascara(t) for t in MOUSE_TARGETS)
+
+
+def is_dark(cell):
+    # Casilla dentro del tablero y oscura
+    return (isinstance(cell, int) and MIN_CELL <= cell <= MAX_CELL
+            and IS_DARK[cell])
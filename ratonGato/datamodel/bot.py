@@ -0,0 +1,59 @@
+# Usuario bot que juega como gato o como raton. Sus movimientos se
+# eligen con la tabla de finales si esta generada o, si no, con la
+# busqueda alfa-beta de datamodel.ai, y se hacen con Game.objects.apply_move
+# para que se validen y guarden igual que los de cualquier jugador.
+
+from django.conf import settings
+from django.contrib.auth.models import User
+
+from datamodel import ai, rules, tablebase
+from datamodel.models import Game, GameStatus
+
+
+def get_bot_user():
+    user, created = User.objects.get_or_create(
+        username=settings.BOT_USERNAME)
+    if created:
+        user.set_unusable_password()
+        user.save()
+    return user
+
+
+def is_bot(user_id):
+    if user_id is None:
+        return False
+    return User.objects.filter(id=user_id,
+                               username=settings.BOT_USERNAME).exists()
+
+
+def choose_move(state):
+    table = tablebase.get_tablebase()
+    if table is None:
+        return ai.choose_move(state, settings.BOT_TIME_BUDGET)
+
+    # Juego perfecto: ganar lo antes posible o perder lo mas tarde posible
+    side = rules.CAT if state.cat_turn else rules.MOUSE
+    best = None
+    for move in rules.legal_moves(state, side):
+        winner, distance = table.lookup(rules.apply(state, move))
+        key = (0, distance) if winner == side else (1, -distance)
+        if best is None or key < best[0]:
+            best = (key, move)
+    return best[1] if best else None
+
+
+def play(game):
+    # Si le toca al bot, elige y realiza su movimiento.
+    # Devuelve el Move creado (con la partida actualizada en move.game) o
+    # None si no le tocaba mover
+    if game.status != GameStatus.ACTIVE:
+        return None
+    player_id = game.cat_user_id if game.cat_turn else game.mouse_user_id
+    if not is_bot(player_id):
+        return None
+
+    move = choose_move(game.state())
+    if move is None:
+        return None
+    # Misma transaccion con la partida bloqueada que un movimiento humano
+    return Game.objects.apply_move(game.id, player_id, move[0], move[1])
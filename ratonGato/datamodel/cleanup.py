@@ -0,0 +1,52 @@
+# Borrado de partidas huerfanas: partidas CREATED a las que nadie se ha
+# unido y creadas hace mas de ORPHAN_GAME_TTL segundos. Se borran en
+# lotes de CHUNK_SIZE, cada uno en una transaccion corta, para no
+# bloquear la tabla Game mientras se juega. Tambien se descartan sus
+# canales de avisos y los de las partidas abandonadas.
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from datamodel import pubsub
+from datamodel.models import Game, GameStatus
+
+CHUNK_SIZE = 500
+
+
+def orphan_games(before):
+    # Partidas sin raton creadas antes de 'before' (indice orphan_games)
+    return Game.objects.filter(status=GameStatus.CREATED,
+                               mouse_user__isnull=True, created__lt=before)
+
+
+def cutoff(ttl=None):
+    # Las partidas creadas antes de este momento son huerfanas
+    if ttl is None:
+        ttl = settings.ORPHAN_GAME_TTL
+    return timezone.now() - timedelta(seconds=ttl)
+
+
+def delete_orphan_games(ttl=None, chunk_size=CHUNK_SIZE):
+    # Devuelve (partidas borradas, segundos empleados)
+    before = cutoff(ttl)
+
+    start = time.perf_counter()
+    total = 0
+    while True:
+        with transaction.atomic():
+            # Bloqueadas hasta borrarlas: nadie se une a ellas entretanto
+            ids = list(orphan_games(before).select_for_update()
+                       .order_by('id').values_list('id', flat=True)
+                       [:chunk_size])
+            if not ids:
+                break
+            _, deleted = Game.objects.filter(id__in=ids).delete()
+        total += deleted.get(Game._meta.label, 0)
+        for game_id in ids:
+            pubsub.discard(Game.channel(game_id))
+    pubsub.sweep()
+    return total, time.perf_counter() - start
@@ -1,2 +1,3 @@
 GAME_SELECTED_SESSION_ID = 'game_selected'
 ERROR_MESSAGE_ID = 'msg_error'
+REPLICA_STICKY_SESSION_ID = 'replica_sticky_until'
@@ -0,0 +1,71 @@
+# Historial de partidas terminadas de un jugador, en uso (Game) y
+# archivadas (ArchivedGame), de la mas reciente a la mas antigua.
+# Se pagina por id (id < before) en lugar de con OFFSET, asi que cada
+# pagina cuesta lo mismo aunque el jugador tenga miles de partidas, y
+# solo se leen las columnas necesarias con values(), sin instancias.
+
+from django.db.models import Q
+
+from datamodel import movelog
+from datamodel.models import ArchivedGame, Game, GameStatus, Move
+
+FIELDS = ('id', 'cat_user__username', 'mouse_user__username', 'winner',
+          'move_count', 'finished_at')
+
+
+def _player(user):
+    return Q(cat_user=user) | Q(mouse_user=user)
+
+
+def _page(queryset, before, size):
+    if before is not None:
+        queryset = queryset.filter(id__lt=before)
+    return list(queryset.order_by('-id')[:size + 1])
+
+
+def page(user, before=None, size=20):
+    # Devuelve {'games': [...], 'next': id desde el que seguir o None}
+    finished = _page(Game.objects.filter(_player(user),
+                                         status=GameStatus.FINISHED)
+                     .values(*FIELDS, 'move_log'), before, size)
+    archived = _page(ArchivedGame.objects.filter(_player(user))
+                     .values(*FIELDS, 'move_log'), before, size)
+    for game in finished:
+        game['archived'] = False
+    for game in archived:
+        game['archived'] = True
+
+    games = sorted(finished + archived, key=lambda g: g['id'],
+                   reverse=True)
+    next_id = games[size - 1]['id'] if len(games) > size else None
+    games = games[:size]
+
+    # Movimientos de las partidas en uso: sus filas Move y su registro
+    # empaquetado; los de las archivadas, de su registro comprimido
+    moves = {game['id']: [] for game in games}
+    live_ids = [game['id'] for game in games if not game['archived']]
+    rows = (Move.objects.filter(game_id__in=live_ids)
+            .order_by('game_id', 'id')
+            .values_list('game_id', 'origin', 'target'))
+    for game_id, origin, target in rows:
+        moves[game_id].append((origin, target))
+
+    result = []
+    for game in games:
+        log = game.pop('move_log')
+        if game['archived']:
+            moves[game['id']] = movelog.decode(log)
+        else:
+            moves[game['id']].extend((origin, target) for origin, target,
+                                     _, _ in movelog.entries(log))
+        result.append({
+            'id': game['id'],
+            'cat_user': game['cat_user__username'],
+            'mouse_user': game['mouse_user__username'],
+            'winner': game['winner'],
+            'move_count': game['move_count'],
+            'finished_at': game['finished_at'],
+            'archived': game['archived'],
+            'moves': moves[game['id']],
+        })
+    return {'games': result, 'next': next_id}
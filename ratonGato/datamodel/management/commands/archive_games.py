@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from datamodel import archive
+
+
+class Command(BaseCommand):
+    help = "Move finished games and their moves to the archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=None,
+                            help="Archive games finished more than this many "
+                                 "days ago (default: ARCHIVE_AFTER_DAYS)")
+        parser.add_argument('--chunk-size', type=int,
+                            default=archive.CHUNK_SIZE,
+                            help="Games archived per transaction")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] <= 0:
+            raise CommandError("The chunk size must be positive")
+        if options['days'] is None:
+            before = archive.default_cutoff()
+        else:
+            before = timezone.now() - timedelta(days=options['days'])
+
+        n_games = archive.archive_finished(before, options['chunk_size'])
+        self.stdout.write("%d games archived" % n_games)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from datamodel.models import PlayerStats
+
+
+class Command(BaseCommand):
+    help = "Compare the stored player statistics with their games"
+
+    def handle(self, *args, **options):
+        wrong = PlayerStats.objects.inconsistencies()
+        for user_id, stored, expected in wrong:
+            self.stdout.write("User %d: stored %s, expected %s" % (
+                user_id, stored, expected))
+        if wrong:
+            raise CommandError("%d players with inconsistent statistics, "
+                               "run rebuild_player_stats" % len(wrong))
+        self.stdout.write("Player statistics are consistent")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from datamodel import cleanup
+
+
+class Command(BaseCommand):
+    help = "Delete the games nobody has joined after a time to live"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl', type=int, default=None,
+                            help="Age in seconds of the games to delete "
+                                 "(default: ORPHAN_GAME_TTL)")
+        parser.add_argument('--chunk-size', type=int,
+                            default=cleanup.CHUNK_SIZE,
+                            help="Games deleted per transaction")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] <= 0:
+            raise CommandError("The chunk size must be positive")
+        n_games, elapsed = cleanup.delete_orphan_games(options['ttl'],
+                                                       options['chunk_size'])
+        self.stdout.write("%d games removed from db in %.2fs" % (n_games,
+                                                                 elapsed))
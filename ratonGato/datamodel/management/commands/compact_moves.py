@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from datamodel import movelog, replay
+from datamodel.models import Game, Move, to_millis
+
+CHUNK_SIZE = 200
+
+
+class Command(BaseCommand):
+    help = "Fold the Move rows of games into their packed move log"
+
+    def add_arguments(self, parser):
+        parser.add_argument('game_ids', nargs='*', type=int,
+                            help="Games to compact (default: all)")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help="Games compacted per transaction")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] <= 0:
+            raise CommandError("The chunk size must be positive")
+
+        games = Game.objects.filter(moves__isnull=False)
+        if options['game_ids']:
+            games = games.filter(id__in=options['game_ids'])
+        games = games.distinct().order_by('id')
+
+        n_games = n_moves = 0
+        while True:
+            ids = list(games.values_list('id', flat=True)
+                       [:options['chunk_size']])
+            if not ids:
+                break
+            for game_id in ids:
+                n_moves += self.compact(game_id)
+            n_games += len(ids)
+        self.stdout.write("%d moves of %d games compacted" % (n_moves,
+                                                              n_games))
+
+    @transaction.atomic
+    def compact(self, game_id):
+        # Las filas son anteriores a lo que ya haya en el registro
+        game = Game.objects.select_for_update().get(id=game_id)
+        rows = list(Move.objects.filter(game_id=game_id).order_by('id'))
+        # El bando de cada movimiento es el de la pieza en la casilla de
+        # origen, reproduciendo la partida desde su posicion inicial
+        state = replay.position_at(game, 0)
+        items = []
+        for move in rows:
+            mouse = not state.cats >> move.origin & 1
+            items.append((move.origin, move.target, mouse,
+                          to_millis(move.date)))
+            state = replay.apply_logged(state, move.origin, move.target)
+        items += list(movelog.entries(game.move_log))
+        Game.objects.filter(id=game_id).update(
+            move_log=movelog.pack_entries(items))
+        Move.objects.filter(id__in=[move.id for move in rows]).delete()
+        return len(rows)
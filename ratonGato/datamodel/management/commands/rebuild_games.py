@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from datamodel import replay
+from datamodel.models import Game
+
+
+class Command(BaseCommand):
+    help = "Rebuild the position of games from their move log"
+
+    def add_arguments(self, parser):
+        parser.add_argument('game_ids', nargs='+', type=int)
+
+    def handle(self, *args, **options):
+        for game_id in options['game_ids']:
+            try:
+                game = Game.objects.get(id=game_id)
+            except Game.DoesNotExist:
+                raise CommandError("Game %d does not exist" % game_id)
+            replay.rebuild_game(game)
+            self.stdout.write("%s" % game)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from datamodel.models import PlayerStats
+
+
+class Command(BaseCommand):
+    help = "Recompute the statistics of every player from their games"
+
+    def handle(self, *args, **options):
+        n_players = PlayerStats.objects.rebuild()
+        self.stdout.write("Statistics of %d players rebuilt" % n_players)
@@ -0,0 +1,114 @@
+import time
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from datamodel import bot, movelog, rules, simulation
+from datamodel.models import Game, GameStatus, Move, PlayerStats
+
+
+class Command(BaseCommand):
+    help = "Play N self-play games in parallel and store the results in a file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('games', type=int, help="Number of games")
+        parser.add_argument('--cat-policy', choices=simulation.POLICIES,
+                            default=simulation.RANDOM)
+        parser.add_argument('--mouse-policy', choices=simulation.POLICIES,
+                            default=simulation.RANDOM)
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Worker processes (default: one per CPU)")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='simulation.csv',
+                            help="Results file (.csv or .bin)")
+        parser.add_argument('--sample', type=int, default=0,
+                            help="Also store this many games in the DB")
+
+    def handle(self, *args, **options):
+        n_games = options['games']
+        if n_games <= 0:
+            raise CommandError("The number of games must be positive")
+
+        tasks = [(i, options['seed'], options['cat_policy'],
+                  options['mouse_policy']) for i in range(n_games)]
+        chunksize = max(1, n_games // 64)
+
+        start = time.perf_counter()
+        if options['workers'] == 1:
+            results = [simulation.play_game(task) for task in tasks]
+        else:
+            with Pool(options['workers']) as pool:
+                results = list(pool.imap_unordered(
+                    simulation.play_game, tasks, chunksize))
+        elapsed = time.perf_counter() - start
+        results.sort()
+
+        path = options['output']
+        if path.endswith('.bin'):
+            simulation.write_binary(path, results)
+        else:
+            simulation.write_csv(path, results)
+
+        n_moves = sum(len(r[2]) for r in results)
+        cat_wins = sum(1 for r in results if r[1] == rules.CAT)
+        self.stdout.write("%d games, %d moves in %.2fs" % (
+            n_games, n_moves, elapsed))
+        self.stdout.write("%.0f games/s, %.0f moves/s" % (
+            n_games / elapsed, n_moves / elapsed))
+        self.stdout.write("Cats won %d, mouse won %d -> %s" % (
+            cat_wins, n_games - cat_wins, path))
+
+        if options['sample'] > 0:
+            stored = self.store_sample(results[:options['sample']])
+            self.stdout.write("%d games stored in the DB" % stored)
+
+    @transaction.atomic
+    def store_sample(self, results):
+        # Partidas terminadas del bot contra si mismo con todos sus
+        # movimientos, para sembrar pruebas de carga
+        player = bot.get_bot_user()
+        games = []
+        now = timezone.now()
+        packed = settings.MOVE_STORAGE == 'packed'
+        now_ms = int(now.timestamp() * 1000)
+        for _, winner, plies, cats, mouse, cat_turn in results:
+            game = Game(cat_user=player, mouse_user=player,
+                        cat1=cats[0], cat2=cats[1], cat3=cats[2],
+                        cat4=cats[3], mouse=mouse, cat_turn=cat_turn,
+                        status=GameStatus.FINISHED, winner=winner,
+                        finished_at=now, move_count=len(plies))
+            if packed:
+                # Los gatos mueven primero: las jugadas impares son del raton
+                game.move_log = movelog.pack_entries(
+                    (origin, target, i % 2 == 1, now_ms)
+                    for i, (origin, target) in enumerate(plies))
+            games.append(game)
+
+        for game in games:
+            # bulk_create no pasa por Game.save
+            game.update_zobrist()
+            game.update_packed_state()
+
+        if connection.features.can_return_ids_from_bulk_insert:
+            Game.objects.bulk_create(games)
+            # bulk_create no actualiza las estadisticas de los jugadores
+            PlayerStats.objects.record_new(game.stats_key()
+                                           for game in games)
+        else:
+            # Sin ids de vuelta del insert masivo: las partidas una a una
+            for game in games:
+                game.save()
+
+        if packed:
+            return len(games)
+
+        moves = []
+        for game, result in zip(games, results):
+            for origin, target in result[2]:
+                moves.append(Move(game=game, player=player,
+                                  origin=origin, target=target))
+        Move.objects.bulk_create(moves, batch_size=1000)
+        return len(games)
@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from datamodel import rules, tablebase
+
+
+class Command(BaseCommand):
+    help = "Solve the whole game by retrograde analysis into a tablebase file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.TABLEBASE_PATH,
+                            help="Tablebase file (default: TABLEBASE_PATH)")
+
+    def handle(self, *args, **options):
+        path = options['output']
+        start = time.time()
+        table = tablebase.solve()
+        tablebase.write(path, table)
+        elapsed = time.time() - start
+
+        self.stdout.write("Solved %d positions in %.1fs -> %s"
+                          % (tablebase.N_POSITIONS, elapsed, path))
+
+        # Valor de la posicion inicial con juego perfecto
+        winner, distance = tablebase.Tablebase(path).lookup(
+            rules.make_state([0, 2, 4, 6], 59))
+        self.stdout.write(self.style.SUCCESS(
+            "Initial position: %s wins in %d plies" % (winner, distance)))
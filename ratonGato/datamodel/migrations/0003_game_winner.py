@@ -0,0 +1,39 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+from datamodel import rules, termination
+
+ACTIVE = 1
+FINISHED = 2
+
+
+def finish_dead_games(apps, schema_editor):
+    # Las partidas activas que ya estaban decididas salen del conjunto
+    # de partidas activas
+    Game = apps.get_model('datamodel', 'Game')
+    games = Game.objects.filter(status=ACTIVE).only(
+        'cat1', 'cat2', 'cat3', 'cat4', 'mouse', 'cat_turn')
+    for game in games.iterator():
+        state = rules.make_state([game.cat1, game.cat2, game.cat3, game.cat4],
+                                 game.mouse, game.cat_turn)
+        winner = termination.winner(state)
+        if winner is not None:
+            Game.objects.filter(id=game.id).update(status=FINISHED,
+                                                   winner=winner)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0002_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='winner',
+            field=models.CharField(blank=True, max_length=5, null=True),
+        ),
+        migrations.RunPython(finish_dead_games, migrations.RunPython.noop),
+    ]
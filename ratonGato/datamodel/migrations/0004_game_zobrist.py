@@ -0,0 +1,32 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+from datamodel import rules, zobrist
+
+
+def backfill_zobrist(apps, schema_editor):
+    Game = apps.get_model('datamodel', 'Game')
+    games = Game.objects.only('cat1', 'cat2', 'cat3', 'cat4', 'mouse',
+                              'cat_turn')
+    for game in games.iterator():
+        state = rules.make_state([game.cat1, game.cat2, game.cat3, game.cat4],
+                                 game.mouse, game.cat_turn)
+        h = zobrist.to_signed(zobrist.hash_state(state))
+        Game.objects.filter(id=game.id).update(zobrist=h)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0003_game_winner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='zobrist',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(backfill_zobrist, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+from datamodel import packing
+
+
+def backfill_packed_state(apps, schema_editor):
+    Game = apps.get_model('datamodel', 'Game')
+    games = Game.objects.only('cat1', 'cat2', 'cat3', 'cat4', 'mouse',
+                              'cat_turn')
+    for game in games.iterator():
+        value = packing.pack([game.cat1, game.cat2, game.cat3, game.cat4],
+                             game.mouse, game.cat_turn)
+        Game.objects.filter(id=game.id).update(packed_state=value)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0004_game_zobrist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='packed_state',
+            field=models.BigIntegerField(default=261993005071),
+        ),
+        migrations.RunPython(backfill_packed_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_move_count(apps, schema_editor):
+    Game = apps.get_model('datamodel', 'Game')
+    games = Game.objects.annotate(n_moves=models.Count('moves')).filter(
+        n_moves__gt=0).values_list('id', 'n_moves')
+    for game_id, n_moves in games.iterator():
+        Game.objects.filter(id=game_id).update(move_count=n_moves)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0005_game_packed_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='move_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='GameSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.IntegerField()),
+                ('packed_state', models.BigIntegerField()),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='datamodel.Game')),
+            ],
+            options={
+                'unique_together': {('game', 'index')},
+            },
+        ),
+        migrations.RunPython(backfill_move_count, migrations.RunPython.noop),
+    ]
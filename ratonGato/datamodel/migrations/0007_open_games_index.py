@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0006_game_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(condition=models.Q(('mouse_user__isnull', True), ('status', 0)), fields=['id'], name='open_games'),
+        ),
+    ]
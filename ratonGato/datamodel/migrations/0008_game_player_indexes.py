@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0007_open_games_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['status', 'cat_user', 'id'], name='status_cat_user'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['status', 'mouse_user', 'id'], name='status_mouse_user'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0008_game_player_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='counter',
+            name='shard',
+            field=models.IntegerField(default=0, unique=True),
+        ),
+    ]
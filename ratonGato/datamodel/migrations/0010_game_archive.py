@@ -0,0 +1,58 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_finished_at(apps, schema_editor):
+    # Las partidas ya terminadas acabaron con su ultimo movimiento
+    Game = apps.get_model('datamodel', 'Game')
+    now = django.utils.timezone.now()
+    games = Game.objects.filter(status=2, finished_at__isnull=True).annotate(
+        last_move=models.Max('moves__date')).values_list('id', 'last_move')
+    for game_id, last_move in games.iterator():
+        Game.objects.filter(id=game_id).update(finished_at=last_move or now)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('datamodel', '0009_counter_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedGame',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('winner', models.CharField(blank=True, max_length=5, null=True)),
+                ('packed_state', models.BigIntegerField()),
+                ('move_count', models.IntegerField(default=0)),
+                ('move_log', models.BinaryField()),
+                ('finished_at', models.DateTimeField(db_index=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['status', 'finished_at'], name='finished_games'),
+        ),
+        migrations.AddField(
+            model_name='archivedgame',
+            name='cat_user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_as_cat', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='archivedgame',
+            name='mouse_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_as_mouse', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_finished_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0010_game_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='move_log',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.AlterField(
+            model_name='move',
+            name='game',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='move_rows', related_query_name='moves', to='datamodel.Game'),
+        ),
+    ]
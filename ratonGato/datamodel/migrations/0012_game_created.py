@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:08
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datamodel', '0011_move_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(condition=models.Q(('mouse_user__isnull', True), ('status', 0)), fields=['created'], name='orphan_games'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_player_stats(apps, schema_editor):
+    # Mismo calculo que PlayerStats.objects.rebuild() (ACTIVE = 1,
+    # FINISHED = 2; las partidas archivadas estan terminadas)
+    Game = apps.get_model('datamodel', 'Game')
+    ArchivedGame = apps.get_model('datamodel', 'ArchivedGame')
+    PlayerStats = apps.get_model('datamodel', 'PlayerStats')
+
+    rows = list(Game.objects.filter(status__in=[1, 2]).values_list(
+        'status', 'winner', 'cat_user_id', 'mouse_user_id').iterator())
+    rows += [(2,) + row for row in ArchivedGame.objects.values_list(
+        'winner', 'cat_user_id', 'mouse_user_id').iterator()]
+
+    stats = {}
+    for status, winner, cat_user_id, mouse_user_id in rows:
+        for user_id, side in ((cat_user_id, 'cat'), (mouse_user_id, 'mouse')):
+            if user_id is None:
+                continue
+            user = stats.setdefault(user_id, PlayerStats(user_id=user_id))
+            if status == 1:
+                user.active += 1
+            else:
+                user.played += 1
+                if winner == side:
+                    setattr(user, 'won_as_' + side,
+                            getattr(user, 'won_as_' + side) + 1)
+    PlayerStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('datamodel', '0012_game_created'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('played', models.IntegerField(default=0)),
+                ('active', models.IntegerField(default=0)),
+                ('won_as_cat', models.IntegerField(default=0)),
+                ('won_as_mouse', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_player_stats, migrations.RunPython.noop),
+    ]
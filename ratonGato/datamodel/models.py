@@ -1,10 +1,24 @@
 # MODIFICADO POR: Víctor García: victor.garciacarrera@estudiante.uam.es,
 #                 Carlos Isasa: carlos.isasa@estudiante.uam.es
 
-from django.db import models
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import (DatabaseError, IntegrityError, connection, models,
+                       transaction)
+from django.db.models import Count, F, Sum
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from django.utils.timezone import utc
+
+from datamodel import (board, movelog, notifications, packing, pubsub,
+                       rules, termination, zobrist)
 
 
 class GameStatus(models.Model):
@@ -13,6 +27,91 @@ class GameStatus(models.Model):
     FINISHED = 2
 
 
+# Controlador de las partidas
+class GameManager(models.Manager):
+
+    def open_games(self, user):
+        # Partidas sin raton de otros jugadores (indice parcial open_games)
+        return self.filter(status=GameStatus.CREATED,
+                           mouse_user__isnull=True).exclude(cat_user=user)
+
+    def active_as_cat(self, user):
+        # Partidas activas de 'user' como gato (indice status_cat_user)
+        return self.filter(status=GameStatus.ACTIVE, cat_user=user)
+
+    def active_as_mouse(self, user):
+        # Partidas activas de 'user' como raton (indice status_mouse_user)
+        return self.filter(status=GameStatus.ACTIVE, mouse_user=user)
+
+    def keyset_page(self, queryset, before=None, size=20):
+        # Pagina de 'size' partidas de 'queryset' con id menor que 'before',
+        # de la mas reciente a la mas antigua. Devuelve la lista y el id a
+        # partir del que empieza la pagina siguiente (None si no hay mas).
+        # Se lee una fila de mas para saber si quedan partidas sin un COUNT
+        queryset = queryset.select_related('cat_user', 'mouse_user')
+        if before is not None:
+            queryset = queryset.filter(id__lt=before)
+        games = list(queryset.order_by('-id')[:size + 1])
+        if len(games) > size:
+            return games[:size], games[size - 1].id
+        return games, None
+
+    def claim_open_game(self, user):
+        # Une a 'user' como raton a la partida abierta mas reciente.
+        # Si la base de datos lo permite, la candidata se elige con
+        # SELECT ... FOR UPDATE SKIP LOCKED, asi que las peticiones
+        # simultaneas se reparten partidas distintas sin esperarse. Si no,
+        # el UPDATE solo modifica la fila si sigue sin raton, de modo que
+        # dos peticiones nunca se unen a la misma partida, y la que pierde
+        # la carrera prueba con la siguiente hasta que no queden abiertas
+        if connection.features.has_select_for_update_skip_locked:
+            with transaction.atomic():
+                game_id = (self.open_games(user).order_by('-id')
+                           .select_for_update(skip_locked=True)
+                           .values_list('id', flat=True).first())
+                if game_id is None:
+                    return None
+                return self._claim(game_id, user)
+
+        while True:
+            game_id = (self.open_games(user).order_by('-id')
+                       .values_list('id', flat=True).first())
+            if game_id is None:
+                return None
+            game = self._claim(game_id, user)
+            if game is not None:
+                return game
+
+    def _claim(self, game_id, user):
+        # UPDATE condicional de la partida; None si ya tiene raton
+        with transaction.atomic():
+            claimed = self.filter(
+                id=game_id, status=GameStatus.CREATED,
+                mouse_user__isnull=True).update(mouse_user=user,
+                                                status=GameStatus.ACTIVE)
+            if not claimed:
+                return None
+            game = self.select_related('mouse_user').get(id=game_id)
+            # El UPDATE no pasa por Game.save: estadisticas aparte
+            PlayerStats.objects.record(
+                (GameStatus.CREATED, None, game.cat_user_id, None),
+                game.stats_key())
+            return game
+
+    def apply_move(self, game_id, user_id, origin, target):
+        # Aplica un movimiento en una unica transaccion: bloquea la fila
+        # de la partida, valida en memoria (sin cargar los usuarios) y
+        # escribe la partida y el movimiento juntos. Devuelve el Move con
+        # la partida ya actualizada en move.game; lanza ValidationError si
+        # el movimiento no es valido y Game.DoesNotExist si no hay partida
+        with transaction.atomic():
+            game = self.select_for_update().get(id=game_id)
+            move = Move(game=game, player_id=user_id, origin=origin,
+                        target=target)
+            move.save()
+        return move
+
+
 class Game(models.Model):
 
     # ID DE PARTIDA UNICO auto-incrementable
@@ -38,21 +137,78 @@ class Game(models.Model):
     # True si turnoGato, False si turnoRaton
 
     status = models.IntegerField(default=GameStatus.CREATED, null=False)
-    MIN_CELL = 0
-    MAX_CELL = 63
-
-    valid_pos = []          # Lista con las casillas validas de juego
-    BOARD = 8               # numero de casillas por fila y columna
-    for i in range(BOARD):          # recorremos por filas
-        for j in range(BOARD):      # recorremos por columnas
-            casilla = BOARD*i + j   # codificacion de la casilla
-            if (i % 2) == 1:        # filas impares
-                if (j % 2) == 1:
-                    valid_pos.append(casilla)
-
-            else:   # fila par
-                if (j % 2 == 0):
-                    valid_pos.append(casilla)
+    # Bando ganador (rules.CAT o rules.MOUSE) cuando la partida termina
+    winner = models.CharField(max_length=5, null=True, blank=True)
+    # Hash Zobrist de la posicion (gatos, raton y turno) como entero de
+    # 64 bits con signo, indexado para buscar posiciones iguales
+    zobrist = models.BigIntegerField(default=0, null=False, db_index=True)
+    # Posicion canonica empaquetada en un entero (ver datamodel/packing.py)
+    packed_state = models.BigIntegerField(
+        default=packing.pack((0, 2, 4, 6), 59, True), null=False)
+    # Numero de movimientos realizados en la partida
+    move_count = models.IntegerField(default=0, null=False)
+    # Momento de creacion, para borrar las partidas que nadie se une
+    created = models.DateTimeField(default=timezone.now, null=False)
+    # Momento en que termino la partida, para archivarla pasado un tiempo
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Registro empaquetado de movimientos (ver datamodel/movelog.py)
+    move_log = models.BinaryField(default=b'', blank=True)
+    MIN_CELL = board.MIN_CELL
+    MAX_CELL = board.MAX_CELL
+
+    # Conjunto inmutable con las casillas validas de juego
+    valid_pos = board.DARK_CELLS
+
+    # Estado para el que el campo zobrist esta actualizado
+    _zobrist_state = None
+    # Campos de los que depende el hash Zobrist guardado
+    ZOBRIST_FIELDS = {'zobrist', 'cat1', 'cat2', 'cat3', 'cat4', 'mouse',
+                      'cat_turn'}
+
+    # Las partidas archivadas se leen de ArchivedGame
+    archived = False
+
+    # stats_key() de la partida tal y como esta en la base de datos; si se
+    # ha leido sin alguno de sus campos no se conoce y save lo consulta
+    _stats_key = None
+    STATS_FIELDS = ('status', 'winner', 'cat_user_id', 'mouse_user_id')
+    STATS_UNKNOWN = object()
+
+    objects = GameManager()
+
+    class Meta:
+        indexes = [
+            # Partidas abiertas a las que unirse, por id
+            models.Index(fields=['id'], name='open_games',
+                         condition=models.Q(status=GameStatus.CREATED,
+                                            mouse_user__isnull=True)),
+            # Partidas de un jugador en un estado, de cada bando
+            models.Index(fields=['status', 'cat_user', 'id'],
+                         name='status_cat_user'),
+            models.Index(fields=['status', 'mouse_user', 'id'],
+                         name='status_mouse_user'),
+            # Partidas sin raton por antiguedad, para borrarlas
+            models.Index(fields=['created'], name='orphan_games',
+                         condition=models.Q(status=GameStatus.CREATED,
+                                            mouse_user__isnull=True)),
+            # Partidas terminadas por antiguedad, para archivarlas
+            models.Index(fields=['status', 'finished_at'],
+                         name='finished_games'),
+        ]
+
+    def packs_moves(self):
+        # Los movimientos se anaden al registro empaquetado con
+        # MOVE_STORAGE = 'packed' o si la partida ya tiene registro, de
+        # modo que sus filas Move siempre son anteriores al registro
+        return settings.MOVE_STORAGE == 'packed' or bool(self.move_log)
+
+    @property
+    def moves(self):
+        # Sin registro empaquetado los movimientos son directamente las
+        # filas Move de la partida
+        if not self.packs_moves():
+            return self.move_rows
+        return MoveList.of(self)
 
     def pos_gatos(self):
         return [int(self.cat1), int(self.cat2), int(self.cat3), int(self.cat4)]
@@ -60,54 +216,142 @@ class Game(models.Model):
     def pos_raton(self):
         return [int(self.mouse)]
 
-    def save(self, *args, **kwargs):
+    def state(self):
+        # Estado de la partida para el motor de reglas
+        return rules.make_state(self.pos_gatos(), self.mouse, self.cat_turn)
+
+    def position_hash(self):
+        # Hash Zobrist de la posicion como entero sin signo de 64 bits
+        return zobrist.to_unsigned(self.zobrist)
+
+    def update_zobrist(self, move=None):
+        # Con un movimiento se actualiza el hash de forma incremental;
+        # si las casillas han cambiado de otra forma se recalcula
+        state = self.state()
+        if move is None:
+            if state != self._zobrist_state:
+                self.zobrist = zobrist.to_signed(zobrist.hash_state(state))
+                self._zobrist_state = state
+            return
+
+        if state == self._zobrist_state:
+            h = zobrist.to_unsigned(self.zobrist)
+        else:
+            h = zobrist.hash_state(state)
+        self.zobrist = zobrist.to_signed(zobrist.update(h, state, move))
+        self._zobrist_state = rules.apply(state, move)
 
-        # Una vez tenemos la lista con las posiciones validas,
-        # comprobamos antes de salvar la partida que las casillas
-        # donde se encuentran los personajes son validas
-        if self.cat_user and ((self.cat1 in self.valid_pos)
-                              and (self.cat2 in self.valid_pos)
-                              and (self.cat3 in self.valid_pos)
-                              and (self.cat4 in self.valid_pos)
-                              and (self.mouse in self.valid_pos)):
-            # Si acabamos de crear la partida y ya hay un jugador raton
-            if self.mouse_user and self.status == GameStatus.CREATED:
-                self.status = GameStatus.ACTIVE
+    def update_packed_state(self):
+        self.packed_state = packing.pack(self.pos_gatos(), int(self.mouse),
+                                         self.cat_turn)
 
-            # Si el raton no puede moverse finaliza la partida
-            derecha_arriba = self.mouse - 7
-            izquierda_arriba = self.mouse - 9
-            derecha_abajo = self.mouse + 9
-            izquierda_abajo = self.mouse + 7
+    def take_snapshot(self):
+        # Guarda la posicion actual tras 'move_count' movimientos
+        GameSnapshot.objects.update_or_create(
+            game=self, index=self.move_count,
+            defaults={'packed_state': self.packed_state})
 
-            movs_raton = [derecha_arriba, izquierda_arriba,
-                          derecha_abajo, izquierda_abajo]
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        game = super().from_db(db, field_names, values)
+        game._loaded_stats()
+        game._loaded_zobrist()
+        return game
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._loaded_stats()
+        self._loaded_zobrist()
+
+    def _loaded_stats(self):
+        # Leer un campo diferido recarga la partida (y vuelve a pasar por
+        # aqui), asi que solo se usan los campos ya leidos
+        if self.get_deferred_fields() & set(self.STATS_FIELDS):
+            self._stats_key = self.STATS_UNKNOWN
+        else:
+            self._stats_key = self.stats_key()
+
+    def _loaded_zobrist(self):
+        # El hash guardado corresponde a la posicion leida, asi que el
+        # primer movimiento lo actualiza de forma incremental en lugar de
+        # recalcularlo (salvo que se haya leido sin alguno de sus campos)
+        if not self.get_deferred_fields() & self.ZOBRIST_FIELDS:
+            self._zobrist_state = self.state()
+
+    @staticmethod
+    def channel(game_id):
+        # Canal de pubsub en el que se publican los cambios de la partida
+        return 'game-%d' % game_id
+
+    def event(self):
+        # Estado compacto de la partida que se envia a quien la sigue
+        return {'id': self.id, 'move': self.move_count,
+                'cats': [self.cat1, self.cat2, self.cat3, self.cat4],
+                'mouse': self.mouse, 'cat_turn': self.cat_turn,
+                'status': self.status, 'winner': self.winner}
+
+    def stats_key(self):
+        # Lo que cuenta en las estadisticas de los jugadores (PlayerStats)
+        return (self.status, self.winner, self.cat_user_id,
+                self.mouse_user_id)
+
+    def valid_cells(self):
+        # Todos los personajes estan en casillas validas (consulta O(1)
+        # en la tabla de casillas oscuras para cada uno)
+        return (board.is_dark(self.cat1) and board.is_dark(self.cat2)
+                and board.is_dark(self.cat3) and board.is_dark(self.cat4)
+                and board.is_dark(self.mouse))
 
-            finish = False
-            for pos in movs_raton:
-                if ((pos in self.pos_gatos()) or (pos < self.MIN_CELL)
-                        or (pos > self.MAX_CELL)):
-                    finish = True
-                else:
-                    finish = False
-                    break
+    def save(self, *args, **kwargs):
 
-            if (finish is True):
-                self.status = GameStatus.FINISHED
+        # Comprobamos antes de salvar la partida que las casillas
+        # donde se encuentran los personajes son validas (por id, sin
+        # cargar los usuarios de la base de datos)
+        if self.cat_user_id is not None and self.valid_cells():
+            # Si acabamos de crear la partida y ya hay un jugador raton
+            if (self.mouse_user_id is not None
+                    and self.status == GameStatus.CREATED):
+                self.status = GameStatus.ACTIVE
 
-            # Salvamos la partida
-            super().save(*args, **kwargs)
+            # Si la partida ya esta decidida (raton encerrado, raton que
+            # ha dejado atras a los gatos...) finaliza y guardamos el ganador
+            if self.status == GameStatus.ACTIVE:
+                winner = termination.winner(self.state())
+                if winner is not None:
+                    self.status = GameStatus.FINISHED
+                    self.winner = winner
+
+            if self.status == GameStatus.FINISHED and self.finished_at is None:
+                self.finished_at = timezone.now()
+
+            self.update_zobrist()
+            self.update_packed_state()
+
+            # Salvamos la partida, junto con las estadisticas de los
+            # jugadores si cambia su estado
+            adding = self._state.adding
+            old_key, new_key = self._stats_key, self.stats_key()
+            if old_key is self.STATS_UNKNOWN:
+                old_key = (Game.objects.filter(pk=self.pk)
+                           .values_list(*self.STATS_FIELDS).first())
+            if old_key == new_key:
+                super().save(*args, **kwargs)
+            else:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                    PlayerStats.objects.record(old_key, new_key)
+                self._stats_key = new_key
+
+            # Foto de la posicion inicial para poder reproducir la partida
+            if adding:
+                self.take_snapshot()
         else:
             raise ValidationError("Invalid cell for a cat or the mouse")
 
     def full_clean(self):
         # Comprobamos que haya jugador gato y las posiciones sean correctas
         try:
-            if self.cat_user and ((self.cat1 in self.valid_pos)
-                                  and (self.cat2 in self.valid_pos)
-                                  and (self.cat3 in self.valid_pos)
-                                  and (self.cat4 in self.valid_pos)
-                                  and (self.mouse in self.valid_pos)):
+            if self.cat_user and self.valid_cells():
                 super().full_clean()
             else:
                 raise ValidationError("Invalid cell for a cat or the mouse")
@@ -163,199 +407,499 @@ class Game(models.Model):
 class Move(models.Model):
     origin = models.IntegerField(null=False)    # Casilla Origen de movimiento
     target = models.IntegerField(null=False)    # Casilla Destino de movimiento
-    game = models.ForeignKey(Game, related_name="moves",
+    # Las filas de una partida estan en game.move_rows; game.moves incluye
+    # tambien las del registro empaquetado (MOVE_STORAGE = 'packed')
+    game = models.ForeignKey(Game, related_name="move_rows",
+                             related_query_name="moves",
                              on_delete=models.CASCADE)
     player = models.ForeignKey(User, on_delete=models.CASCADE)
     date = models.DateTimeField(null=False, default=timezone.now)
 
     def save(self, *args, **kwargs):
-        derecha_arriba = self.origin - 7
-        izquierda_arriba = self.origin - 9
-        derecha_abajo = self.origin + 9
-        izquierda_abajo = self.origin + 7
-
-        mov_gato = [derecha_abajo, izquierda_abajo]
-        mov_raton = [derecha_arriba, izquierda_arriba,
-                     derecha_abajo, izquierda_abajo]
+        game = self.game
 
         # Si el juego no permite movimientos
-        if ((self.game.status == GameStatus.CREATED)
-                or (self.game.status == GameStatus.FINISHED)):
+        if game.status != GameStatus.ACTIVE:
             raise ValidationError("Move not allowed")
 
-        # print("ESTOS SON LOS GATOS" + str(self.game.pos_gatos()))
-        # Comprobar si el movimieto va a una posicion OCUPADA
-        if ((self.target in self.game.pos_gatos())
-                or (self.target in self.game.pos_raton())):
+        # Solo puede mover el jugador al que le toca
+        if game.cat_turn:
+            player_id = game.cat_user_id
+        else:
+            player_id = game.mouse_user_id
+        if player_id is None or self.player_id != player_id:
             raise ValidationError("Move not allowed")
 
-        # No puedes moverte mas alla de la primera y ultima fila
-        if ((self.target <= self.game.MAX_CELL) and
-           (self.target >= self.game.MIN_CELL)):
-            if ((self.player == self.game.cat_user) and self.game.cat_turn):
-                # Gatos no pueden moverse atras
-                if ((self.origin % 8) == 0):
-                    # Columna 0 no puede moverse izquierda
-                    if (self.target == derecha_abajo):
-                        if self.actualizarMove() is True:
-                            # Si puede actualizar el movimiento del juego
-                            super().save(*args, **kwargs)
-                            # Añadimos el movimiento
-                        else:
-                            raise ValidationError("Move not allowed")
-                    else:
-                        raise ValidationError("Move not allowed")
-
-                elif ((self.origin % 8) == 7):
-                    # Columna 7 no puede moverse derecha
-                    if (self.target == izquierda_abajo):
-                        if self.actualizarMove() is True:
-                            # Si puede actualizar el movimiento deljuego
-                            super().save(*args, **kwargs)
-                            # Añadimos el movimiento
-                        else:
-                            raise ValidationError("Move not allowed")
-                    else:
-                        raise ValidationError("Move not allowed")
-                else:
-                    if ((self.target in mov_gato)):
-                        if self.actualizarMove() is True:
-                            # Si puede actualizar el movimiento deljuego
-                            super().save(*args, **kwargs)
-                            # Añadimos el movimiento
-                        else:
-                            raise ValidationError("Move not allowed")
-                    else:
-                        raise ValidationError("Move not allowed")
-
-            elif ((self.player == self.game.mouse_user)
-                  and not(self.game.cat_turn)):
-                if (self.origin % 8 == 0):
-                    # Columna 0 no puede moverse izquierda
-                    if ((self.target == derecha_abajo)
-                            or (self.target == derecha_arriba)):
-                        if self.actualizarMove() is True:
-                            # Si puede actualizar el movimiento deljuego
-                            super().save(*args, **kwargs)
-                            # Añadimos el movimiento
-                        else:
-                            raise ValidationError("Move not allowed")
-                    else:
-                        raise ValidationError("Move not allowed")
-
-                elif (self.origin % 8 == 7):
-                    # Columna 7 no puede moverse derecha
-                    if ((self.target == izquierda_abajo)
-                            or (self.target == izquierda_arriba)):
-                        if self.actualizarMove() is True:
-                            # Si puede actualizar el movimiento deljuego
-                            super().save(*args, **kwargs)
-                            # Añadimos el movimiento
-                        else:
-                            raise ValidationError("Move not allowed")
-                    else:
-                        raise ValidationError("Move not allowed")
-
-                else:
-                    if ((self.target in mov_raton)):
-                        if self.actualizarMove() is True:
-                            # Si puede actualizar el movimiento deljuego
-                            super().save(*args, **kwargs)
-                            # Añadimos el movimiento
-                        else:
-                            raise ValidationError("Move not allowed")
-                    else:
-                        raise ValidationError("Move not allowed")
-            else:
-                raise ValidationError("Move not allowed")
+        # El motor de reglas valida origen, destino y casillas ocupadas
+        if not rules.is_legal(game.state(), (self.origin, self.target)):
+            raise ValidationError("Move not allowed")
 
+        packed = game.packs_moves()
+        if self.actualizarMove(packed) is True:
+            # Si puede actualizar el movimiento del juego
+            if not packed:
+                super().save(*args, **kwargs)
+                # Añadimos el movimiento (si no, ya esta en el registro
+                # empaquetado de la partida)
         else:
             raise ValidationError("Move not allowed")
 
-    def actualizarMove(self):
-        # Comprobar si el movimieto parte de una posición actual del juego
-        if ((self.origin not in self.game.pos_gatos())
-                and (self.origin not in self.game.pos_raton())):
-            return False
-
-        # Movimiento de un gato
-        if ((self.player == self.game.cat_user) and self.game.cat_turn):
-            if self.origin not in self.game.pos_gatos():
-                return False
+        # Cada SNAPSHOT_INTERVAL movimientos guardamos una foto de la
+        # posicion para reproducir la partida sin recorrer todo el historial
+        if game.move_count % settings.REPLAY_SNAPSHOT_INTERVAL == 0:
+            game.take_snapshot()
+
+        # Avisamos a quien este esperando este movimiento o siguiendo la
+        # partida cuando se confirme la transaccion
+        game_id, move_count = game.id, game.move_count
+        channel = Game.channel(game_id)
+        event = json.dumps(game.event(), separators=(',', ':'))
+
+        finished = game.status == GameStatus.FINISHED
+
+        def announce():
+            notifications.notify(game_id, move_count)
+            pubsub.publish(channel, event)
+            if finished:
+                # Ya no habra mas movimientos en la partida
+                pubsub.discard(channel)
+        transaction.on_commit(announce)
+
+    def actualizarMove(self, packed=False):
+        # Aplica el movimiento (ya validado) sobre las casillas del juego
+        game = self.game
+        game.update_zobrist((self.origin, self.target))
+        if game.cat_turn:
+            # Movimiento de un gato: actualizamos el primero que este
+            # en la casilla de origen
+            for field in ('cat1', 'cat2', 'cat3', 'cat4'):
+                if int(getattr(game, field)) == self.origin:
+                    setattr(game, field, self.target)
+                    break
             else:
-                # Actualizamos el turno
-                self.game.cat_turn = False
-
-                if(self.origin == self.game.pos_gatos()[0]):
-                    # Movimiento gato1
-                    self.game.cat1 = self.target
-                elif(self.origin == self.game.pos_gatos()[1]):
-                    # Movimiento gato2
-                    self.game.cat2 = self.target
-                elif(self.origin == self.game.pos_gatos()[2]):
-                    # Movimiento gato3
-                    self.game.cat3 = self.target
-                else:  # Movimiento gato4
-                    self.game.cat4 = self.target
-
-        # Movimiento de un raton
-        if ((self.player == self.game.mouse_user)
-                and (not self.game.cat_turn)):
-            if self.origin not in self.game.pos_raton():
                 return False
-            else:
-                # Actualizamos el turno
-                self.game.cat_turn = True
-                # Actualizamos la pos del raton
-                self.game.mouse = self.target
-
-        self.game.save()
+        else:
+            # Movimiento del raton
+            if int(game.mouse) != self.origin:
+                return False
+            game.mouse = self.target
+
+        if packed:
+            # Anadimos el movimiento al registro de la partida, que se
+            # guarda con ella en lugar de insertar una fila Move
+            game.move_log = movelog.append_entry(
+                game.move_log, self.origin, self.target, not game.cat_turn,
+                to_millis(self.date))
+
+        # Actualizamos el turno
+        game.cat_turn = not game.cat_turn
+        game.move_count += 1
+        game.save()
         return True
 
 
-# Implementa el controlador del Counter
-class CounterManager(models.Manager):  # models.Manager
+def to_millis(date):
+    return int(date.timestamp() * 1000)
 
-    @classmethod
-    def inc(self):
-        # Obtenemos todos los objetos que existen de la clase
-        objects = Counter.objects.all()
 
-        # No existe el contador
-        if len(objects) == 0:
-            counter = self.singleton()
-        else:
-            counter = objects[0]
+def from_millis(time_ms):
+    return datetime.fromtimestamp(time_ms / 1000, tz=utc)
 
-        # Incrementamos el valor del contador
-        counter.value += 1
-        # Actualizamos el valor
-        super(Counter, counter).save()
-        return counter.value
 
-    # Crea un unico contador siguiendo el diseño Singleton
-    @classmethod
-    def singleton(self):
-        cont = Counter(value=0)
-        # Actualizamos el valor
-        super(Counter, cont).save()
-        return cont
+# Movimientos de una partida: sus filas Move y, a continuacion, los del
+# registro empaquetado. Imita lo que se usa de un QuerySet de Move; los
+# movimientos del registro son instancias de Move sin id
+class MoveList:
+    def __init__(self, moves):
+        self._moves = list(moves)
 
     @classmethod
-    def get_current_value(self):
-        # Obtenemos todos los objetos que existen de la clase
-        objects = Counter.objects.all()
+    def of(cls, game):
+        moves = list(Move.objects.filter(game_id=game.id).order_by('id'))
+        log = (Game.objects.filter(id=game.id)
+               .values_list('move_log', flat=True).first())
+        for origin, target, mouse, time_ms in movelog.entries(log):
+            player_id = game.mouse_user_id if mouse else game.cat_user_id
+            moves.append(Move(game=game, player_id=player_id, origin=origin,
+                              target=target, date=from_millis(time_ms)))
+        return cls(moves)
+
+    def all(self):
+        return self
+
+    def order_by(self, *fields):
+        # Los movimientos ya estan en orden cronologico
+        if fields and fields[0] in ('-id', '-date'):
+            return MoveList(reversed(self._moves))
+        return self
+
+    def filter(self, **kwargs):
+        def matches(move):
+            for key, value in kwargs.items():
+                if isinstance(value, models.Model):
+                    key, value = key + '_id', value.pk
+                if getattr(move, key) != value:
+                    return False
+            return True
+        return MoveList(move for move in self._moves if matches(move))
+
+    def values_list(self, *fields, flat=False):
+        if flat:
+            return [getattr(move, fields[0]) for move in self._moves]
+        return [tuple(getattr(move, f) for f in fields)
+                for move in self._moves]
+
+    def count(self):
+        return len(self._moves)
+
+    def exists(self):
+        return bool(self._moves)
+
+    def first(self):
+        return self._moves[0] if self._moves else None
+
+    def last(self):
+        return self._moves[-1] if self._moves else None
+
+    def get(self, **kwargs):
+        moves = self.filter(**kwargs)._moves
+        if not moves:
+            raise Move.DoesNotExist("Move matching query does not exist.")
+        if len(moves) > 1:
+            raise Move.MultipleObjectsReturned(
+                "get() returned more than one Move")
+        return moves[0]
+
+    def __iter__(self):
+        return iter(self._moves)
+
+    def __len__(self):
+        return len(self._moves)
+
+    def __getitem__(self, index):
+        return self._moves[index]
+
+
+# Posicion de una partida tras 'index' movimientos (datamodel/replay.py)
+class GameSnapshot(models.Model):
+    game = models.ForeignKey(Game, related_name="snapshots",
+                             on_delete=models.CASCADE)
+    index = models.IntegerField(null=False)
+    packed_state = models.BigIntegerField(null=False)
+
+    class Meta:
+        unique_together = ('game', 'index')
+
+
+# Partida terminada archivada (datamodel/archive.py). Conserva el id de
+# la partida original y sus movimientos en un unico campo comprimido
+class ArchivedGame(models.Model):
+    id = models.IntegerField(primary_key=True)
+    cat_user = models.ForeignKey(User, on_delete=models.CASCADE,
+                                 related_name="archived_as_cat")
+    mouse_user = models.ForeignKey(User, on_delete=models.CASCADE,
+                                   related_name="archived_as_mouse",
+                                   null=True, blank=True)
+    winner = models.CharField(max_length=5, null=True, blank=True)
+    # Posicion final empaquetada (ver datamodel/packing.py)
+    packed_state = models.BigIntegerField(null=False)
+    move_count = models.IntegerField(default=0, null=False)
+    # Movimientos codificados con datamodel/movelog.py
+    move_log = models.BinaryField(null=False)
+    finished_at = models.DateTimeField(null=True, db_index=True)
+
+    archived = True
+    status = GameStatus.FINISHED
+
+    def logged_moves(self):
+        return movelog.decode(self.move_log)
 
-        # No existe el contador, valor inicial de 0
-        if len(objects) == 0:
-            return 0
-        return objects[0].value
+    def __str__(self):
+        return "(%d, Archived) winner: %s" % (self.id, self.winner)
+
+
+# Controlador de las estadisticas de los jugadores
+class PlayerStatsManager(models.Manager):
+
+    FIELDS = ('played', 'active', 'won_as_cat', 'won_as_mouse')
+
+    @staticmethod
+    def contributions(key):
+        # Suma que aporta a cada jugador una partida con ese stats_key:
+        # {user_id: {campo: cantidad}}. Una partida archivada es FINISHED
+        if key is None:
+            return {}
+        status, winner, cat_user_id, mouse_user_id = key
+        result = {}
+        for user_id, side in ((cat_user_id, rules.CAT),
+                              (mouse_user_id, rules.MOUSE)):
+            if user_id is None or status == GameStatus.CREATED:
+                continue
+            counts = result.setdefault(user_id, {})
+            field = 'active' if status == GameStatus.ACTIVE else 'played'
+            counts[field] = counts.get(field, 0) + 1
+            if status == GameStatus.FINISHED and winner == side:
+                field = 'won_as_' + side
+                counts[field] = counts.get(field, 0) + 1
+        return result
+
+    def record(self, old_key, new_key):
+        # Aplica la diferencia entre dos estados de una partida
+        deltas = self.contributions(new_key)
+        for user_id, counts in self.contributions(old_key).items():
+            user_deltas = deltas.setdefault(user_id, {})
+            for field, n in counts.items():
+                user_deltas[field] = user_deltas.get(field, 0) - n
+
+        for user_id, counts in deltas.items():
+            counts = {f: n for f, n in counts.items() if n}
+            if counts:
+                self.add(user_id, counts)
+
+    def record_new(self, keys):
+        # Suma de una vez las aportaciones de varias partidas nuevas (las
+        # creadas con bulk_create no pasan por Game.save)
+        totals = {}
+        for key in keys:
+            for user_id, counts in self.contributions(key).items():
+                user_totals = totals.setdefault(user_id, {})
+                for field, n in counts.items():
+                    user_totals[field] = user_totals.get(field, 0) + n
+        for user_id, counts in totals.items():
+            self.add(user_id, counts)
+
+    def add(self, user_id, counts):
+        # Suma 'counts' a la fila del jugador con un UPDATE atomico,
+        # creandola si no existe
+        update = {f: F(f) + n for f, n in counts.items()}
+        if self.filter(user_id=user_id).update(**update):
+            return
+        try:
+            with transaction.atomic():
+                self.create(user_id=user_id, **counts)
+        except IntegrityError:
+            # Otro proceso ha creado la fila a la vez
+            self.filter(user_id=user_id).update(**update)
+
+    def expected(self):
+        # Estadisticas calculadas desde las partidas en uso y archivadas:
+        # {user_id: {campo: cantidad}}
+        totals = {}
+
+        def accumulate(key, n):
+            for user_id, counts in self.contributions(key).items():
+                user_totals = totals.setdefault(
+                    user_id, dict.fromkeys(self.FIELDS, 0))
+                for field, count in counts.items():
+                    user_totals[field] += count * n
+
+        games = (Game.objects.exclude(status=GameStatus.CREATED)
+                 .values_list('status', 'winner', 'cat_user_id',
+                              'mouse_user_id')
+                 .annotate(n=Count('id')).order_by())
+        for status, winner, cat_user_id, mouse_user_id, n in games:
+            accumulate((status, winner, cat_user_id, mouse_user_id), n)
+
+        archived = (ArchivedGame.objects
+                    .values_list('winner', 'cat_user_id', 'mouse_user_id')
+                    .annotate(n=Count('id')).order_by())
+        for winner, cat_user_id, mouse_user_id, n in archived:
+            accumulate((GameStatus.FINISHED, winner, cat_user_id,
+                        mouse_user_id), n)
+        return totals
+
+    def stored(self):
+        return {row[0]: dict(zip(self.FIELDS, row[1:]))
+                for row in self.values_list('user_id', *self.FIELDS)}
+
+    def inconsistencies(self):
+        # Lista de (user_id, guardado, esperado) de los jugadores cuyas
+        # estadisticas no coinciden con sus partidas
+        expected, stored = self.expected(), self.stored()
+        zero = dict.fromkeys(self.FIELDS, 0)
+        return [(user_id, stored.get(user_id, zero),
+                 expected.get(user_id, zero))
+                for user_id in sorted(set(expected) | set(stored))
+                if stored.get(user_id, zero) != expected.get(user_id, zero)]
+
+    @transaction.atomic
+    def rebuild(self):
+        # Recalcula la tabla entera; devuelve el numero de jugadores
+        expected = self.expected()
+        self.all().delete()
+        self.bulk_create([PlayerStats(user_id=user_id, **counts)
+                          for user_id, counts in expected.items()])
+        return len(expected)
+
+
+# Resumen de las partidas de cada jugador, mantenido al cambiar el estado
+# de sus partidas para no tener que recorrer Game y Move
+class PlayerStats(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name="stats")
+    # Partidas terminadas, contando cada bando (como gato y como raton)
+    played = models.IntegerField(default=0, null=False)
+    # Partidas activas
+    active = models.IntegerField(default=0, null=False)
+    won_as_cat = models.IntegerField(default=0, null=False)
+    won_as_mouse = models.IntegerField(default=0, null=False)
+
+    objects = PlayerStatsManager()
+
+    def __str__(self):
+        return "%s: %d played, %d active, %d won as cat, %d won as mouse" % (
+            self.user_id, self.played, self.active, self.won_as_cat,
+            self.won_as_mouse)
+
+
+# Implementa el controlador del Counter
+class CounterManager(models.Manager):  # models.Manager
+    # El contador global se reparte en COUNTER_SHARDS filas. Cada hilo
+    # de cada proceso incrementa siempre la misma fila con un UPDATE
+    # atomico (value = value + 1), asi que las peticiones simultaneas no
+    # pierden incrementos ni esperan todas por la misma fila; el valor del
+    # contador es la suma de todas ellas.
+    # Con COUNTER_FLUSH_INTERVAL > 0 los incrementos se acumulan en memoria
+    # y se escriben como mucho cada ese numero de segundos: un hilo de cada
+    # proceso los escribe aunque no lleguen mas peticiones, y lo pendiente
+    # se escribe tambien al terminar el proceso. Un proceso hijo (fork)
+    # hereda una copia de lo pendiente del padre, que no es suyo: lo
+    # escribe el padre, asi que el hijo lo descarta.
+
+    _lock = threading.Lock()
+    _pending = 0
+    # Proceso al que pertenece _pending
+    _pending_pid = None
+    _last_flush = None
+    # Proceso en el que corre el hilo de escritura periodica y evento
+    # para pararlo
+    _flusher_pid = None
+    _flusher = None
+    _stop = None
+
+    def shard(self):
+        # Fila del contador que le toca al hilo actual
+        key = hash((os.getpid(), threading.get_ident()))
+        return key % settings.COUNTER_SHARDS
+
+    def add(self, n=1):
+        # Suma 'n' a la fila del hilo actual, creandola si no existe
+        shard = self.shard()
+        if self.filter(shard=shard).update(value=F('value') + n):
+            return
+        try:
+            with transaction.atomic():
+                cont = Counter(shard=shard, value=n)
+                super(Counter, cont).save()
+        except IntegrityError:
+            # Otro hilo ha creado la fila a la vez
+            self.filter(shard=shard).update(value=F('value') + n)
+
+    def inc(self):
+        if settings.COUNTER_FLUSH_INTERVAL <= 0:
+            self.add(1)
+            return self.get_current_value()
+
+        cls = type(self)
+        with cls._lock:
+            self._own_pending()
+            cls._pending += 1
+            last = cls._last_flush
+        if cls._flusher_pid != os.getpid():
+            self.start_flusher()
+        if (last is None or time.monotonic() - last
+                >= settings.COUNTER_FLUSH_INTERVAL):
+            self.flush()
+        return self.get_current_value()
+
+    def _own_pending(self):
+        # Descarta lo pendiente heredado de otro proceso; con _lock tomado
+        cls = type(self)
+        if cls._pending_pid != os.getpid():
+            cls._pending = 0
+            cls._pending_pid = os.getpid()
+
+    def start_flusher(self):
+        # Arranca el hilo de escritura periodica de este proceso (tras un
+        # fork el hilo del padre no existe en el hijo)
+        cls = type(self)
+        with cls._lock:
+            if cls._flusher_pid == os.getpid():
+                return
+            cls._flusher_pid = os.getpid()
+            cls._stop = threading.Event()
+            cls._flusher = threading.Thread(
+                target=self._flush_periodically, args=(cls._stop,),
+                daemon=True, name='counter-flush')
+        atexit.register(self.flush)
+        cls._flusher.start()
+
+    def stop_flusher(self):
+        # Para el hilo de escritura periodica de este proceso, sin
+        # escribir lo pendiente
+        cls = type(self)
+        with cls._lock:
+            if cls._flusher_pid != os.getpid():
+                return
+            thread, cls._flusher = cls._flusher, None
+            cls._stop.set()
+        thread.join()
+
+    def _flush_periodically(self, stop):
+        # Termina si se desactiva la escritura diferida o se para el hilo
+        cls = type(self)
+        try:
+            while settings.COUNTER_FLUSH_INTERVAL > 0:
+                interval = settings.COUNTER_FLUSH_INTERVAL
+                if stop.wait(min(interval, 1)):
+                    break
+                last = cls._last_flush
+                if last is not None and time.monotonic() - last < interval:
+                    continue
+                try:
+                    self.flush()
+                except DatabaseError as err:
+                    # Lo pendiente se queda para el siguiente intento
+                    print('Counter flush failed:', err)
+                finally:
+                    connection.close()
+        finally:
+            with cls._lock:
+                # Salvo que ya se haya arrancado otro hilo
+                if cls._stop is stop:
+                    cls._flusher_pid = None
+                    cls._flusher = None
+
+    def flush(self):
+        # Escribe en la base de datos los incrementos acumulados
+        cls = type(self)
+        with cls._lock:
+            self._own_pending()
+            pending, cls._pending = cls._pending, 0
+            cls._last_flush = time.monotonic()
+        if pending:
+            try:
+                self.add(pending)
+            except Exception:
+                with cls._lock:
+                    cls._pending += pending
+                raise
+
+    def get_current_value(self):
+        # Suma de todas las filas mas lo que este proceso aun no ha
+        # escrito; lo de los demas procesos llega en COUNTER_FLUSH_INTERVAL
+        total = self.aggregate(total=Sum('value'))['total'] or 0
+        with type(self)._lock:
+            self._own_pending()
+            return total + type(self)._pending
 
 
 # Clase que implementa el registro de las peticiones recibidas
 class Counter(models.Model):
     # Contador de peticiones inicializado a 0
     value = models.IntegerField(default=0, null=False)
+    # Fila del contador repartido (ver CounterManager)
+    shard = models.IntegerField(default=0, null=False, unique=True)
 
     # Sobreescribimos el Manager de Counter
     objects = CounterManager()
@@ -0,0 +1,96 @@
+# Registro compacto de los movimientos de una partida.
+# Todo movimiento va a una casilla diagonal vecina, asi que basta con la
+# casilla de origen (6 bits) y la direccion (2 bits): un byte por
+# movimiento. La secuencia se comprime ademas con zlib.
+
+import zlib
+
+# Desplazamiento del destino respecto al origen para cada direccion
+STEPS = (-9, -7, 7, 9)
+_DIRECTION = {step: d for d, step in enumerate(STEPS)}
+
+
+def encode(moves):
+    # moves: secuencia de pares (origen, destino)
+    data = bytearray()
+    for origin, target in moves:
+        try:
+            direction = _DIRECTION[target - origin]
+        except KeyError:
+            raise ValueError("Not a diagonal move: %d -> %d" % (origin,
+                                                                target))
+        data.append(origin << 2 | direction)
+    return zlib.compress(bytes(data))
+
+
+def decode(blob):
+    # Lista de pares (origen, destino) de un registro codificado
+    moves = []
+    for byte in zlib.decompress(bytes(blob)):
+        origin = byte >> 2
+        moves.append((origin, origin + STEPS[byte & 3]))
+    return moves
+
+
+# Registro empaquetado de una partida en curso (Game.move_log, con
+# MOVE_STORAGE = 'packed'). Cada movimiento ocupa un byte de origen (con
+# el bit 7 a 1 si mueve el raton), un byte de destino y el tiempo en
+# milisegundos desde el movimiento anterior (desde el epoch en el primero)
+# como entero de longitud variable: 7 bits por byte, bit 7 de continuacion.
+# Se escribe solo anadiendo al final, sin comprimir.
+
+MOUSE_FLAG = 0x80
+
+
+def _write_entry(data, origin, target, mouse, delta):
+    data.append(origin | (MOUSE_FLAG if mouse else 0))
+    data.append(target)
+    while True:
+        byte = delta & 0x7f
+        delta >>= 7
+        if delta:
+            data.append(byte | 0x80)
+        else:
+            data.append(byte)
+            return
+
+
+def pack_entries(items):
+    # Registro con los movimientos (origen, destino, mueve_raton, momento
+    # en ms desde el epoch) en orden
+    data = bytearray()
+    last = 0
+    for origin, target, mouse, time_ms in items:
+        _write_entry(data, origin, target, mouse, max(0, time_ms - last))
+        last = max(last, time_ms)
+    return bytes(data)
+
+
+def append_entry(log, origin, target, mouse, time_ms):
+    # Devuelve 'log' con el movimiento anadido al final
+    last = 0
+    for entry in entries(log):
+        last = entry[3]
+    data = bytearray(log or b'')
+    _write_entry(data, origin, target, mouse, max(0, time_ms - last))
+    return bytes(data)
+
+
+def entries(log):
+    # Itera los movimientos del registro como tuplas
+    # (origen, destino, mueve_raton, momento en ms desde el epoch)
+    data = bytes(log or b'')
+    pos, now = 0, 0
+    while pos < len(data):
+        origin, target = data[pos], data[pos + 1]
+        pos += 2
+        delta, shift = 0, 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            delta |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        now += delta
+        yield origin & ~MOUSE_FLAG, target, bool(origin & MOUSE_FLAG), now
@@ -0,0 +1,56 @@
+# Avisos de movimientos dentro del proceso.
+# Las peticiones que esperan el movimiento del rival se apuntan al canal
+# de su partida y duermen en una Condition hasta que Move.save avisa con
+# el nuevo numero de movimientos (o hasta que vence el tiempo), sin
+# consultar la base de datos mientras esperan. Los canales solo existen
+# mientras alguien espera en ellos.
+# Solo se despiertan las esperas del proceso que guarda el movimiento;
+# con varios procesos las demas lo ven al vencer su tiempo.
+
+import threading
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_channels = {}
+
+
+class Channel:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.move_count = -1
+        self.listeners = 0
+
+    def wait(self, known, timeout):
+        # True si la partida pasa de 'known' movimientos antes de 'timeout'
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: self.move_count > known, timeout)
+
+
+@contextmanager
+def listen(game_id):
+    # Canal de la partida; hay que apuntarse antes de leer su estado para
+    # no perder un aviso que llegue entre la lectura y la espera
+    with _lock:
+        channel = _channels.get(game_id)
+        if channel is None:
+            channel = _channels[game_id] = Channel()
+        channel.listeners += 1
+    try:
+        yield channel
+    finally:
+        with _lock:
+            channel.listeners -= 1
+            if channel.listeners == 0:
+                del _channels[game_id]
+
+
+def notify(game_id, move_count):
+    # Despierta a quien espere en la partida
+    with _lock:
+        channel = _channels.get(game_id)
+    if channel is None:
+        return
+    with channel.condition:
+        channel.move_count = max(channel.move_count, move_count)
+        channel.condition.notify_all()
@@ -0,0 +1,51 @@
+# Estado canonico de una partida empaquetado en un unico entero:
+#     bits  0-31   mascara de gatos sobre las 32 casillas oscuras
+#     bits 32-36   indice (0..31) de la casilla oscura del raton
+#     bit  37      turno de los gatos
+# Los gatos son intercambiables, asi que el orden de cat1..cat4 no
+# afecta al valor. Cabe en un BIGINT con signo sin llegar al bit 63.
+
+from datamodel import board
+
+N_DARK = 32
+MOUSE_SHIFT = 32
+TURN_SHIFT = 37
+CATS_MASK = (1 << N_DARK) - 1
+MOUSE_MASK = 0x1f
+
+# Casilla del tablero correspondiente a cada indice oscuro
+# (el indice de una casilla oscura es simplemente casilla // 2)
+DARK_CELL = tuple(sorted(board.DARK_CELLS))
+
+
+def pack(cats, mouse, cat_turn):
+    value = 0
+    for cat in cats:
+        value |= 1 << (cat >> 1)
+    return (value | (mouse >> 1) << MOUSE_SHIFT
+            | int(bool(cat_turn)) << TURN_SHIFT)
+
+
+def unpack(value):
+    # Devuelve (lista de casillas de gatos ordenada, raton, turno_gato)
+    cats = []
+    mask = value & CATS_MASK
+    while mask:
+        low = mask & -mask
+        cats.append(DARK_CELL[low.bit_length() - 1])
+        mask ^= low
+    mouse = DARK_CELL[value >> MOUSE_SHIFT & MOUSE_MASK]
+    return cats, mouse, bool(value >> TURN_SHIFT & 1)
+
+
+def pack_state(state):
+    # Empaqueta un estado del motor de reglas (mascaras de 64 bits)
+    value = 0
+    mask = state.cats
+    while mask:
+        low = mask & -mask
+        value |= 1 << ((low.bit_length() - 1) >> 1)
+        mask ^= low
+    mouse = state.mouse.bit_length() - 1
+    return (value | (mouse >> 1) << MOUSE_SHIFT
+            | int(state.cat_turn) << TURN_SHIFT)
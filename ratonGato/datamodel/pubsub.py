@@ -0,0 +1,218 @@
+# Publicacion/suscripcion de mensajes (cadenas) por canal, para repartir
+# los cambios de una partida entre todos los que la siguen.
+# El backend se elige con settings.PUBSUB, como CACHES:
+#   MemoryPubSub: colas en memoria; no llega a los suscriptores de otros
+#       procesos.
+#   FilePubSub: un fichero por canal en un directorio local que todos los
+#       procesos de la maquina anaden y leen; sustituye a un servidor de
+#       mensajes cuando hay varios workers. El fichero se borra al
+#       descartar el canal (al terminar, archivar o borrar la partida) o,
+#       si la partida se abandona, al barrer los canales sin mensajes
+#       desde hace PUBSUB_CHANNEL_TTL segundos.
+
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    # Mensajes publicados en un canal desde que se crea la suscripcion
+    def get(self, timeout):
+        # Siguiente mensaje o None si no llega ninguno en 'timeout' segundos
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PubSub:
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        raise NotImplementedError
+
+    def discard(self, channel):
+        # El canal ya no va a recibir mas mensajes
+        pass
+
+    def sweep(self, max_age):
+        # Descarta los canales sin mensajes en 'max_age' segundos;
+        # devuelve cuantos
+        return 0
+
+
+class MemorySubscription(Subscription):
+    def __init__(self, pubsub, channel):
+        self.pubsub = pubsub
+        self.channel = channel
+        self.queue = queue.Queue()
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.pubsub._unsubscribe(self)
+
+
+class MemoryPubSub(PubSub):
+    def __init__(self, **options):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+
+    def publish(self, channel, message):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.queue.put(message)
+
+    def subscribe(self, channel):
+        subscription = MemorySubscription(self, channel)
+        with self.lock:
+            self.subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(subscription.channel, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self.subscribers.pop(subscription.channel, None)
+
+
+class FileSubscription(Subscription):
+    def __init__(self, pubsub, path):
+        self.pubsub = pubsub
+        self.path = path
+        self.pending = []
+        self.partial = b''
+        # Se abre (creandolo si hace falta) al suscribirse y se lee desde
+        # el final: el fichero abierto se sigue pudiendo leer aunque se
+        # borre al terminar la partida, asi que no se pierden los ultimos
+        # mensajes
+        fd = os.open(path, os.O_RDONLY | os.O_CREAT, 0o644)
+        self.file = os.fdopen(fd, 'rb')
+        self.file.seek(0, os.SEEK_END)
+
+    def _read(self):
+        data = self.partial + self.file.read()
+        # Una linea sin terminar aun se esta escribiendo
+        end = data.rfind(b'\n') + 1
+        self.partial = data[end:]
+        self.pending.extend(line.decode() for line in
+                            data[:end].splitlines())
+
+    def get(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            if not self.pending:
+                self._read()
+            if self.pending:
+                return self.pending.pop(0)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(self.pubsub.poll_interval, remaining))
+
+    def close(self):
+        self.file.close()
+
+
+class FilePubSub(PubSub):
+    def __init__(self, path, poll_interval=0.05, **options):
+        self.path = path
+        self.poll_interval = poll_interval
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, channel):
+        return os.path.join(self.path, '%s.log' % channel)
+
+    def publish(self, channel, message):
+        # Cada mensaje es una linea escrita de una vez en modo O_APPEND,
+        # asi que no se mezclan los de distintos procesos
+        if '\n' in message:
+            raise ValueError("Messages must be a single line")
+        fd = os.open(self._file(channel),
+                     os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (message + '\n').encode())
+        finally:
+            os.close(fd)
+
+    def subscribe(self, channel):
+        return FileSubscription(self, self._file(channel))
+
+    def discard(self, channel):
+        # Los suscriptores que ya tienen abierto el fichero terminan de
+        # leerlo
+        try:
+            os.remove(self._file(channel))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self, max_age):
+        before = time.time() - max_age
+        swept = 0
+        for entry in os.scandir(self.path):
+            if not entry.name.endswith('.log'):
+                continue
+            try:
+                if entry.stat().st_mtime < before:
+                    os.remove(entry.path)
+                    swept += 1
+            except FileNotFoundError:
+                # Otro proceso lo ha descartado a la vez
+                pass
+        return swept
+
+
+_pubsub = None
+
+
+def get_pubsub():
+    global _pubsub
+    if _pubsub is None:
+        backend = import_string(settings.PUBSUB['BACKEND'])
+        _pubsub = backend(**settings.PUBSUB.get('OPTIONS', {}))
+    return _pubsub
+
+
+def _reset(setting, **kwargs):
+    global _pubsub
+    if setting == 'PUBSUB':
+        _pubsub = None
+
+
+setting_changed.connect(_reset)
+
+
+def publish(channel, message):
+    get_pubsub().publish(channel, message)
+
+
+def subscribe(channel):
+    return get_pubsub().subscribe(channel)
+
+
+def discard(channel):
+    get_pubsub().discard(channel)
+
+
+def sweep(max_age=None):
+    if max_age is None:
+        max_age = settings.PUBSUB_CHANNEL_TTL
+    return get_pubsub().sweep(max_age)
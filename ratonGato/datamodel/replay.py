@@ -0,0 +1,121 @@
+# Reproduccion del historial de una partida.
+# La posicion tras cualquier numero de movimientos se reconstruye desde
+# la foto (GameSnapshot) mas cercana anterior, aplicando a lo sumo
+# REPLAY_SNAPSHOT_INTERVAL movimientos del registro. Sin fotos se parte
+# de la posicion inicial por defecto. Las partidas archivadas
+# (ArchivedGame) se reproducen desde su registro comprimido.
+
+from django.db import transaction
+
+from datamodel import packing, rules
+from datamodel.models import ArchivedGame, Game
+
+INITIAL_CATS = (0, 2, 4, 6)
+INITIAL_MOUSE = 59
+
+
+def initial_state():
+    return rules.make_state(INITIAL_CATS, INITIAL_MOUSE, True)
+
+
+def state_from_packed(value):
+    cats, mouse, cat_turn = packing.unpack(value)
+    return rules.make_state(cats, mouse, cat_turn)
+
+
+def apply_logged(state, origin, target):
+    # Aplica un movimiento del registro; mueve la pieza que este en la
+    # casilla de origen y pasa el turno al otro bando
+    delta = (1 << origin) | (1 << target)
+    if state.cats >> origin & 1:
+        return rules.State(state.cats ^ delta, state.mouse, False)
+    return rules.State(state.cats, state.mouse ^ delta, True)
+
+
+def replay_moves(state, moves):
+    # Aplica una secuencia de pares (origen, destino)
+    for origin, target in moves:
+        state = apply_logged(state, origin, target)
+    return state
+
+
+def position_at(game, index):
+    # Estado de la partida tras 'index' movimientos
+    if index < 0 or index > game.move_count:
+        raise ValueError("Move index out of range: %d" % index)
+
+    if game.archived:
+        return replay_moves(initial_state(), game.logged_moves()[:index])
+
+    snapshot = (game.snapshots.filter(index__lte=index)
+                .order_by('-index').values_list('index', 'packed_state')
+                .first())
+    if snapshot is None:
+        start, state = 0, initial_state()
+    else:
+        start, state = snapshot[0], state_from_packed(snapshot[1])
+
+    moves = (game.moves.order_by('id')
+             .values_list('origin', 'target')[start:index])
+    return replay_moves(state, moves)
+
+
+def history(game):
+    # Lista con todas las posiciones de la partida, de la inicial a la
+    # actual, recorriendo el registro una sola vez
+    if game.archived:
+        states = [initial_state()]
+        for origin, target in game.logged_moves():
+            states.append(apply_logged(states[-1], origin, target))
+        return states
+
+    snapshot = (game.snapshots.order_by('index')
+                .values_list('index', 'packed_state').first())
+    if snapshot is not None and snapshot[0] == 0:
+        state = state_from_packed(snapshot[1])
+    else:
+        state = initial_state()
+
+    states = [state]
+    for origin, target in game.moves.order_by('id').values_list('origin',
+                                                                'target'):
+        state = apply_logged(state, origin, target)
+        states.append(state)
+    return states
+
+
+def find_game(game_id):
+    # Partida con ese id, en uso o archivada
+    game = Game.objects.filter(id=game_id).first()
+    if game is None:
+        game = ArchivedGame.objects.filter(id=game_id).first()
+    if game is None:
+        raise Game.DoesNotExist("Game %d does not exist" % game_id)
+    return game
+
+
+@transaction.atomic
+def rebuild_game(game):
+    # Reconstruye las casillas, el turno y el numero de movimientos de
+    # una partida reproduciendo todo su registro desde la foto inicial.
+    # Las demas fotos son copias de la propia partida y pueden arrastrar
+    # la corrupcion, asi que no se usan y se reescriben con lo reproducido
+    states = history(game)
+    game.move_count = len(states) - 1
+    state = states[-1]
+
+    cats = rules.cells(state.cats)
+    game.cat1, game.cat2, game.cat3, game.cat4 = cats
+    game.mouse = state.mouse.bit_length() - 1
+    game.cat_turn = state.cat_turn
+    # El hash guardado tampoco es de fiar: se recalcula
+    game._zobrist_state = None
+    game.save()
+
+    game.snapshots.filter(index__gt=game.move_count).delete()
+    for index, packed_state in (game.snapshots.filter(index__gt=0)
+                                .values_list('index', 'packed_state')):
+        value = packing.pack_state(states[index])
+        if packed_state != value:
+            game.snapshots.filter(index=index).update(packed_state=value)
+    return game
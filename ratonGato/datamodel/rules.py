@@ -0,0 +1,96 @@
+# Motor de reglas del juego independiente del ORM.
+# Las posiciones se representan como mascaras de 64 bits (un bit por
+# casilla): una mascara con los 4 gatos y otra con el raton. Los vecinos
+# diagonales de cada casilla estan precalculados, de modo que validar un
+# movimiento se reduce a unas pocas operaciones con enteros.
+
+from collections import namedtuple
+
+from datamodel import board
+from datamodel.board import MAX_CELL, MIN_CELL
+
+CAT = 'cat'
+MOUSE = 'mouse'
+
+# Estado de una partida: mascara de gatos, mascara del raton y turno
+State = namedtuple('State', ['cats', 'mouse', 'cat_turn'])
+
+# Casillas validas de juego (casillas oscuras)
+DARK = board.DARK_MASK
+
+# Vecinos diagonales precalculados: los gatos solo avanzan hacia abajo,
+# el raton se mueve en las 4 diagonales
+CAT_NEIGHBORS = board.CAT_MASKS
+MOUSE_NEIGHBORS = board.MOUSE_MASKS
+
+valid_cell = board.is_dark
+
+
+def cells(mask):
+    # Lista de casillas ocupadas en una mascara, en orden creciente
+    res = []
+    while mask:
+        low = mask & -mask
+        res.append(low.bit_length() - 1)
+        mask ^= low
+    return res
+
+
+def make_state(cats, mouse, cat_turn=True):
+    # Construye un estado a partir de las casillas de los gatos y el raton
+    mask = 0
+    for cat in cats:
+        mask |= 1 << int(cat)
+    return State(mask, 1 << int(mouse), bool(cat_turn))
+
+
+def legal_moves(state, side):
+    # Lista de movimientos (origen, destino) legales para un bando,
+    # independientemente de a quien le toque mover
+    occupied = state.cats | state.mouse
+    if side == CAT:
+        pieces, neighbors = state.cats, CAT_NEIGHBORS
+    else:
+        pieces, neighbors = state.mouse, MOUSE_NEIGHBORS
+
+    moves = []
+    for origin in cells(pieces):
+        free = neighbors[origin] & ~occupied
+        for target in cells(free):
+            moves.append((origin, target))
+    return moves
+
+
+def is_legal(state, move):
+    # Comprueba si el movimiento es legal para el bando al que le toca
+    origin, target = move
+    if not (isinstance(origin, int) and isinstance(target, int)):
+        return False
+    if not (MIN_CELL <= origin <= MAX_CELL and MIN_CELL <= target <= MAX_CELL):
+        return False
+
+    if state.cat_turn:
+        pieces, neighbors = state.cats, CAT_NEIGHBORS
+    else:
+        pieces, neighbors = state.mouse, MOUSE_NEIGHBORS
+
+    # El origen debe ser una pieza propia y el destino una casilla
+    # diagonal libre
+    return bool(pieces >> origin & 1
+                and neighbors[origin] >> target & 1
+                and not (state.cats | state.mouse) >> target & 1)
+
+
+def apply(state, move):
+    # Devuelve el estado resultante de aplicar un movimiento legal
+    origin, target = move
+    delta = (1 << origin) | (1 << target)
+    if state.cat_turn:
+        return State(state.cats ^ delta, state.mouse, False)
+    return State(state.cats, state.mouse ^ delta, True)
+
+
+def mouse_trapped(state):
+    # El raton no tiene ninguna casilla libre a la que moverse
+    mouse = state.mouse.bit_length() - 1
+    return not (MOUSE_NEIGHBORS[mouse] & ~state.cats)
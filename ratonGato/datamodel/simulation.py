@@ -0,0 +1,82 @@
+# Partidas simuladas sobre el motor de reglas, sin tocar la base de datos.
+# Las funciones son de modulo para poder repartirlas entre procesos.
+
+import csv
+import random
+import struct
+
+from datamodel import ai, rules, termination
+
+RANDOM = 'random'
+HEURISTIC = 'heuristic'
+POLICIES = (RANDOM, HEURISTIC)
+
+INITIAL_CATS = (0, 2, 4, 6)
+INITIAL_MOUSE = 59
+
+# Registro binario: partida, ganador, n_movimientos, 4 gatos y raton;
+# seguido de un byte de origen y otro de destino por movimiento
+RECORD = struct.Struct('<IBB5B')
+WINNER_CODES = {None: 0, rules.CAT: 1, rules.MOUSE: 2}
+
+
+def random_policy(state, moves, rnd):
+    return rnd.choice(moves)
+
+
+def heuristic_policy(state, moves, rnd):
+    # Movimiento que deja la mejor valoracion estatica (a un nivel),
+    # desempatando al azar
+    best, best_score = [], None
+    for move in moves:
+        score = -ai.evaluate(rules.apply(state, move))
+        if best_score is None or score > best_score:
+            best, best_score = [move], score
+        elif score == best_score:
+            best.append(move)
+    return rnd.choice(best)
+
+
+_POLICY_FUNCTIONS = {RANDOM: random_policy, HEURISTIC: heuristic_policy}
+
+
+def play_game(args):
+    # Juega una partida completa y devuelve
+    # (indice, ganador, movimientos, gatos, raton, turno_gato)
+    index, seed, cat_policy, mouse_policy = args
+    rnd = random.Random(seed + index)
+    policies = {True: _POLICY_FUNCTIONS[cat_policy],
+                False: _POLICY_FUNCTIONS[mouse_policy]}
+
+    state = rules.make_state(INITIAL_CATS, INITIAL_MOUSE)
+    moves = []
+    winner = termination.winner(state)
+    while winner is None:
+        side = rules.CAT if state.cat_turn else rules.MOUSE
+        move = policies[state.cat_turn](
+            state, rules.legal_moves(state, side), rnd)
+        moves.append(move)
+        state = rules.apply(state, move)
+        winner = termination.winner(state)
+
+    mouse = state.mouse.bit_length() - 1
+    return (index, winner, moves, tuple(rules.cells(state.cats)), mouse,
+            state.cat_turn)
+
+
+def write_csv(path, results):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['game', 'winner', 'plies', 'cat1', 'cat2', 'cat3',
+                         'cat4', 'mouse', 'moves'])
+        for index, winner, moves, cats, mouse, _ in results:
+            writer.writerow([index, winner, len(moves)] + list(cats)
+                            + [mouse, ' '.join('%d-%d' % m for m in moves)])
+
+
+def write_binary(path, results):
+    with open(path, 'wb') as f:
+        for index, winner, moves, cats, mouse, _ in results:
+            f.write(RECORD.pack(index, WINNER_CODES[winner], len(moves),
+                                *(cats + (mouse,))))
+            f.write(bytes(cell for move in moves for cell in move))
@@ -0,0 +1,214 @@
+# Tabla de finales del juego completo calculada por analisis retrogrado.
+#
+# Una posicion son 4 gatos indistinguibles y un raton sobre las 32
+# casillas oscuras, mas el turno. Se numeran con un rango combinatorio:
+#     rango = (rango_gatos*32 + raton)*2 + turno_gato
+# donde rango_gatos es el indice de la combinacion de 4 casillas oscuras
+# en el sistema combinatorio de numeracion. Cada posicion ocupa un byte:
+#     0              posicion imposible (raton sobre un gato)
+#     1 + 2*d        el bando al que le toca gana en d medios movimientos
+#     1 + 2*d + 1    el bando al que le toca pierde en d medios movimientos
+#
+# Los gatos solo avanzan, asi que cada movimiento de gato aumenta la suma
+# de sus filas: el grafo de posiciones no tiene ciclos y se resuelve
+# hacia atras desde las posiciones en las que los gatos ya no pueden
+# avanzar, por capas de suma de filas decreciente.
+#
+# El fichero resultante se abre con mmap, de modo que todos los procesos
+# del servidor comparten la misma copia en la cache de paginas.
+
+import mmap
+import os
+import struct
+from itertools import combinations
+
+from django.conf import settings
+
+from datamodel import rules, termination
+from datamodel.board import BOARD, CAT_MASKS, DARK_CELLS, MOUSE_MASKS
+
+MAGIC = b'MCTB'
+VERSION = 1
+HEADER = struct.Struct('<4sHHI')   # magic, version, reservado, n_posiciones
+
+N_DARK = 32
+N_CATS = 4
+
+# Coeficientes binomiales C(n, k) para n <= 32, k <= 4
+BINOMIAL = [[0]*(N_CATS + 1) for _ in range(N_DARK + 1)]
+for _n in range(N_DARK + 1):
+    BINOMIAL[_n][0] = 1
+    for _k in range(1, min(_n, N_CATS) + 1):
+        BINOMIAL[_n][_k] = BINOMIAL[_n - 1][_k - 1] + BINOMIAL[_n - 1][_k]
+
+N_CAT_SETS = BINOMIAL[N_DARK][N_CATS]
+N_POSITIONS = N_CAT_SETS * N_DARK * 2
+
+ILLEGAL = 0
+
+
+class TablebaseError(Exception):
+    pass
+
+
+def dark_index(cell):
+    # Las casillas oscuras de cada fila alternan columna, por lo que la
+    # mitad de la casilla las numera de 0 a 31
+    return cell // 2
+
+
+def rank_cats(indices):
+    # Rango combinatorio de 4 indices oscuros ordenados
+    return sum(BINOMIAL[d][i + 1] for i, d in enumerate(sorted(indices)))
+
+
+def rank(state):
+    cats = [dark_index(c) for c in rules.cells(state.cats)]
+    if len(cats) != N_CATS:
+        raise TablebaseError("Position needs four distinct cats")
+    mouse = dark_index(state.mouse.bit_length() - 1)
+    return (rank_cats(cats)*N_DARK + mouse)*2 + int(state.cat_turn)
+
+
+def encode(win, distance):
+    return 1 + 2*distance + (0 if win else 1)
+
+
+def decode(value):
+    # Devuelve (gana_el_que_mueve, distancia) o None si es imposible
+    if value == ILLEGAL:
+        return None
+    value -= 1
+    return value % 2 == 0, value // 2
+
+
+def solve():
+    # Resuelve todas las posiciones y devuelve la tabla como bytearray
+    dark = sorted(DARK_CELLS)
+    table = bytearray(N_POSITIONS)
+
+    cat_sets = []
+    set_rank = {}
+    for indices in combinations(range(N_DARK), N_CATS):
+        mask = 0
+        for d in indices:
+            mask |= 1 << dark[d]
+        set_rank[mask] = rank_cats(indices)
+        cat_sets.append(mask)
+
+    # Primero los conjuntos de gatos mas avanzados: sus sucesores tras un
+    # movimiento de gato ya estan resueltos
+    cat_sets.sort(key=lambda m: -sum(c // BOARD for c in rules.cells(m)))
+
+    for cats in cat_sets:
+        base = set_rank[cats]*N_DARK
+        cat_list = rules.cells(cats)
+
+        for cat_turn in (True, False):
+            for mouse in dark:
+                if cats >> mouse & 1:
+                    continue
+                state = rules.State(cats, 1 << mouse, cat_turn)
+                index = (base + dark_index(mouse))*2 + int(cat_turn)
+
+                # Sin pasar por la cache de termination: cada posicion se
+                # evalua una sola vez
+                winner = termination.winner.__wrapped__(state)
+                if winner is not None:
+                    side = rules.CAT if cat_turn else rules.MOUSE
+                    table[index] = encode(winner == side, 0)
+                    continue
+
+                occupied = cats | state.mouse
+                children = []
+                if cat_turn:
+                    # Sucesores con el raton al turno en una capa posterior
+                    for cat in cat_list:
+                        free = CAT_MASKS[cat] & ~occupied
+                        while free:
+                            low = free & -free
+                            free ^= low
+                            child = set_rank[cats ^ (1 << cat) ^ low]
+                            children.append(
+                                table[(child*N_DARK + dark_index(mouse))*2])
+                else:
+                    # Sucesores con los gatos al turno en esta misma capa
+                    free = MOUSE_MASKS[mouse] & ~occupied
+                    while free:
+                        low = free & -free
+                        free ^= low
+                        target = low.bit_length() - 1
+                        children.append(
+                            table[(base + dark_index(target))*2 + 1])
+
+                table[index] = _negamax(children)
+
+    return table
+
+
+def _negamax(children):
+    # Gana si algun sucesor es perdedor para el rival (lo antes posible);
+    # si no, pierde retrasando la derrota todo lo posible
+    best_win = None
+    worst_loss = 0
+    for value in children:
+        win, distance = decode(value)
+        if not win:
+            if best_win is None or distance < best_win:
+                best_win = distance
+        elif distance > worst_loss:
+            worst_loss = distance
+    if best_win is not None:
+        return encode(True, best_win + 1)
+    return encode(False, worst_loss + 1)
+
+
+def write(path, table):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(table)))
+        f.write(table)
+    os.replace(tmp, path)
+
+
+class Tablebase:
+    # Tabla de finales de solo lectura respaldada por mmap
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, size = HEADER.unpack_from(self._map, 0)
+        if (magic != MAGIC or version != VERSION or size != N_POSITIONS
+                or len(self._map) != HEADER.size + size):
+            self._map.close()
+            raise TablebaseError("Invalid tablebase file: %s" % path)
+
+    def close(self):
+        self._map.close()
+
+    def value(self, state):
+        return self._map[HEADER.size + rank(state)]
+
+    def lookup(self, state):
+        # Devuelve (bando ganador, medios movimientos hasta el final)
+        res = decode(self.value(state))
+        if res is None:
+            raise TablebaseError("Illegal position")
+        win, distance = res
+        to_move = rules.CAT if state.cat_turn else rules.MOUSE
+        other = rules.MOUSE if state.cat_turn else rules.CAT
+        return (to_move if win else other), distance
+
+
+_tablebase = None
+
+
+def get_tablebase():
+    # Tabla compartida por el proceso, o None si no se ha generado
+    global _tablebase
+    if _tablebase is None:
+        path = settings.TABLEBASE_PATH
+        if not os.path.exists(path):
+            return None
+        _tablebase = Tablebase(path)
+    return _tablebase
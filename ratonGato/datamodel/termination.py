@@ -0,0 +1,49 @@
+# Deteccion de fin de partida sobre el estado del motor de reglas.
+# Una partida termina cuando:
+#   - el raton no tiene ninguna casilla a la que moverse (ganan los gatos)
+#   - el raton ha llegado a la fila de salida de los gatos o ha dejado
+#     atras a todos los gatos: como los gatos solo avanzan hacia abajo
+#     ya no pueden encerrarlo (gana el raton)
+#   - los gatos no pueden mover en su turno (gana el raton)
+# Los resultados se memorizan por posicion, ya que el numero de
+# posiciones distintas que se dan en las partidas es muy pequeño.
+
+from functools import lru_cache
+
+from datamodel import rules
+from datamodel.board import BOARD, CAT_MASKS
+
+CACHE_SIZE = 1 << 16
+
+
+def lowest_cell(mask):
+    return (mask & -mask).bit_length() - 1
+
+
+def mouse_escaped(state):
+    # El raton esta en la fila del gato mas adelantado o por encima:
+    # siempre tiene una diagonal libre hacia arriba y nadie puede cortarle
+    mouse_row = lowest_cell(state.mouse) // BOARD
+    first_cat_row = lowest_cell(state.cats) // BOARD
+    return mouse_row <= first_cat_row
+
+
+def cats_blocked(state):
+    # Ningun gato tiene una casilla libre hacia delante
+    occupied = state.cats | state.mouse
+    for cat in rules.cells(state.cats):
+        if CAT_MASKS[cat] & ~occupied:
+            return False
+    return True
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def winner(state):
+    # Devuelve rules.CAT, rules.MOUSE o None si la partida sigue abierta
+    if mouse_escaped(state):
+        return rules.MOUSE
+    if rules.mouse_trapped(state):
+        return rules.CAT
+    if state.cat_turn and cats_blocked(state):
+        return rules.MOUSE
+    return None
@@ -0,0 +1,191 @@
+import csv
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import movelog, pubsub, replay, rules, simulation, tests
+from .models import ArchivedGame, Game, GameSnapshot, GameStatus, Move
+
+
+class SimulateCommandTests(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test1(self):
+        """ Resultados en CSV y muestra en la base de datos """
+        path = os.path.join(self.tmpdir, "sim.csv")
+        out = StringIO()
+        call_command("simulate", 20, workers=1, output=path, sample=3, stdout=out)
+        self.assertRegex(out.getvalue(), r"games/s, \d+ moves/s")
+
+        with open(path) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), 20)
+        for row in rows:
+            self.assertIn(row["winner"], [rules.CAT, rules.MOUSE])
+            self.assertEqual(len(row["moves"].split()), int(row["plies"]))
+
+        games = Game.objects.filter(status=GameStatus.FINISHED)
+        self.assertEqual(games.count(), 3)
+        for game, row in zip(games.order_by("id"), rows):
+            self.assertEqual(game.moves.count(), int(row["plies"]))
+            self.assertEqual(game.winner, row["winner"])
+
+    def test2(self):
+        """ Las partidas son reproducibles con la misma semilla """
+        task = (7, 0, simulation.HEURISTIC, simulation.RANDOM)
+        self.assertEqual(simulation.play_game(task), simulation.play_game(task))
+
+        path = os.path.join(self.tmpdir, "sim.bin")
+        call_command("simulate", 5, workers=1, output=path, stdout=StringIO())
+        with open(path, "rb") as f:
+            data = f.read()
+        offset = 0
+        for _ in range(5):
+            _, winner, plies, *_ = simulation.RECORD.unpack_from(data, offset)
+            self.assertIn(winner, [1, 2])
+            offset += simulation.RECORD.size + 2*plies
+        self.assertEqual(offset, len(data))
+
+
+class ArchiveCommandTests(tests.BaseModelTest):
+    def setUp(self):
+        super().setUp()
+        self.game = Game.objects.create(
+            cat_user=self.users[0], mouse_user=self.users[1], status=GameStatus.ACTIVE)
+        for origin, target in [(0, 9), (59, 50), (2, 11), (50, 41), (4, 13)]:
+            player = self.users[0] if self.game.cat_turn else self.users[1]
+            Move.objects.create(game=self.game, player=player, origin=origin, target=target)
+        self.states = replay.history(self.game)
+        self.game.status = GameStatus.FINISHED
+        self.game.save()
+        self.active = Game.objects.create(
+            cat_user=self.users[0], mouse_user=self.users[1], status=GameStatus.ACTIVE)
+
+    def test1(self):
+        """ Las partidas terminadas recientes no se archivan """
+        self.assertIsNotNone(self.game.finished_at)
+        out = StringIO()
+        call_command("archive_games", days=1, stdout=out)
+        self.assertIn("0 games archived", out.getvalue())
+        self.assertEqual(ArchivedGame.objects.count(), 0)
+
+    def test2(self):
+        """ Archivado de partidas terminadas con sus movimientos """
+        out = StringIO()
+        call_command("archive_games", days=0, chunk_size=1, stdout=out)
+        self.assertIn("1 games archived", out.getvalue())
+
+        self.assertFalse(Game.objects.filter(id=self.game.id).exists())
+        self.assertFalse(Move.objects.filter(game_id=self.game.id).exists())
+        self.assertFalse(GameSnapshot.objects.filter(game_id=self.game.id).exists())
+        self.assertTrue(Game.objects.filter(id=self.active.id).exists())
+
+        archived = replay.find_game(self.game.id)
+        self.assertIsInstance(archived, ArchivedGame)
+        self.assertEqual(archived.move_count, 5)
+        self.assertEqual(archived.packed_state, self.game.packed_state)
+        self.assertEqual(replay.history(archived), self.states)
+        self.assertEqual(replay.position_at(archived, 3), self.states[3])
+
+
+class CompactMovesCommandTests(tests.BaseModelTest):
+    def setUp(self):
+        super().setUp()
+        # Los dos bandos los juega el mismo usuario, como en las partidas
+        # del bot contra si mismo
+        self.game = Game.objects.create(
+            cat_user=self.users[0], mouse_user=self.users[0], status=GameStatus.ACTIVE)
+        for origin, target in [(0, 9), (59, 50), (2, 11)]:
+            Move.objects.create(game=self.game, player=self.users[0], origin=origin, target=target)
+        self.rows = list(self.game.moves.order_by("id").values_list("origin", "target", "player_id"))
+
+    def test1(self):
+        """ Las filas Move se pliegan en el registro empaquetado """
+        out = StringIO()
+        call_command("compact_moves", stdout=out)
+        self.assertIn("3 moves of 1 games compacted", out.getvalue())
+        self.assertFalse(Move.objects.filter(game=self.game).exists())
+
+        game = Game.objects.get(id=self.game.id)
+        self.assertEqual(game.moves.values_list("origin", "target", "player_id"), self.rows)
+        self.assertEqual([mouse for _, _, mouse, _ in movelog.entries(game.move_log)],
+                         [False, True, False])
+
+        # Una partida con registro empaquetado sigue anadiendo a el
+        Move.objects.create(game=game, player=self.users[0], origin=50, target=41)
+        self.assertFalse(Move.objects.filter(game=self.game).exists())
+        self.assertEqual(game.moves.count(), 4)
+        self.assertEqual(game.moves.last().origin, 50)
+        self.assertEqual(replay.history(game)[-1], game.state())
+
+
+class PubSubDirMixin:
+    # Canales en ficheros de un directorio temporal
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.pubsub_settings = override_settings(PUBSUB={
+            "BACKEND": "datamodel.pubsub.FilePubSub",
+            "OPTIONS": {"path": self.tmpdir}})
+        self.pubsub_settings.enable()
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        self.pubsub_settings.disable()
+        shutil.rmtree(self.tmpdir)
+
+    def channel_files(self):
+        return sorted(os.listdir(self.tmpdir))
+
+
+class ArchiveChannelsTests(PubSubDirMixin, ArchiveCommandTests):
+    def test3(self):
+        """ Se descartan los canales de las partidas archivadas """
+        for game in (self.game, self.active):
+            pubsub.publish(Game.channel(game.id), "{}")
+        call_command("archive_games", days=0, stdout=StringIO())
+        self.assertEqual(self.channel_files(), ["game-%d.log" % self.active.id])
+
+
+class CleanOrphanGamesCommandTests(tests.BaseModelTest):
+    def test1(self):
+        """ Borrado por lotes de las partidas sin raton pasado su TTL """
+        games = [Game.objects.create(cat_user=self.users[0]) for _ in range(5)]
+        Game.objects.filter(id__in=[g.id for g in games[:4]]).update(
+            created=timezone.now() - timedelta(hours=2))
+
+        out = StringIO()
+        call_command("clean_orphan_games", ttl=3600, chunk_size=3, stdout=out)
+        self.assertRegex(out.getvalue(), r"^4 games removed from db in \d+\.\d+s")
+        self.assertEqual(list(Game.objects.values_list("id", flat=True)), [games[4].id])
+        self.assertFalse(GameSnapshot.objects.exclude(game_id=games[4].id).exists())
+
+
+class CleanOrphanChannelsTests(PubSubDirMixin, tests.BaseModelTest):
+    def test1(self):
+        """ Se descartan los canales de las partidas borradas y los que
+        llevan PUBSUB_CHANNEL_TTL sin mensajes """
+        orphan, recent, abandoned = [Game.objects.create(cat_user=self.users[0])
+                                     for _ in range(3)]
+        Game.objects.filter(id=orphan.id).update(
+            created=timezone.now() - timedelta(hours=2))
+        for game in (orphan, recent, abandoned):
+            pubsub.publish(Game.channel(game.id), "{}")
+        old = time.time() - 3600
+        os.utime(os.path.join(self.tmpdir, "game-%d.log" % abandoned.id), (old, old))
+
+        with self.settings(PUBSUB_CHANNEL_TTL=1800):
+            call_command("clean_orphan_games", ttl=3600, stdout=StringIO())
+        self.assertEqual(self.channel_files(), ["game-%d.log" % recent.id])
+        self.assertTrue(Game.objects.filter(id=abandoned.id).exists())
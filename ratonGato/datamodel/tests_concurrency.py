@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.test import TransactionTestCase, override_settings
+
+from .models import Counter, CounterManager, Game, GameManager, GameStatus
+
+N_THREADS = 8
+
+
+def retry_locked(target, i):
+    # La base de datos SQLite en memoria de los tests (cache compartida)
+    # devuelve "table is locked" en lugar de esperar al bloqueo como haria
+    # PostgreSQL; en ese caso se repite la llamada
+    while True:
+        try:
+            return target(i)
+        except OperationalError as err:
+            if "locked" not in str(err):
+                raise
+            time.sleep(0.001)
+
+
+def run_in_threads(n, target):
+    # Lanza 'n' hilos que arrancan a la vez y devuelve sus resultados
+    barrier = threading.Barrier(n)
+    results = [None]*n
+    errors = []
+
+    def worker(i):
+        try:
+            barrier.wait()
+            results[i] = retry_locked(target, i)
+        except Exception as err:
+            errors.append(err)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+class MatchmakingConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        self.cat = User.objects.create_user(username="cat_user_test", password="cat_user_test")
+        self.mice = [User.objects.create_user(username="mouse_%d" % i, password="mouse_%d" % i)
+                     for i in range(N_THREADS)]
+
+    def test1(self):
+        """ Una unica partida abierta y varios ratones a la vez """
+        game = Game.objects.create(cat_user=self.cat)
+        results = run_in_threads(
+            N_THREADS, lambda i: Game.objects.claim_open_game(self.mice[i]))
+
+        claimed = [r for r in results if r is not None]
+        self.assertEqual(len(claimed), 1)
+        game = Game.objects.get(id=game.id)
+        self.assertEqual(game.status, GameStatus.ACTIVE)
+        self.assertEqual(game.mouse_user, claimed[0].mouse_user)
+
+    def test2(self):
+        """ Ninguna partida se une dos veces y todas acaban con raton """
+        games = [Game.objects.create(cat_user=self.cat) for _ in range(N_THREADS - 2)]
+        results = run_in_threads(
+            N_THREADS, lambda i: Game.objects.claim_open_game(self.mice[i]))
+
+        claimed = [r.id for r in results if r is not None]
+        self.assertEqual(sorted(claimed), sorted(g.id for g in games))
+        for game in Game.objects.filter(id__in=claimed):
+            self.assertEqual(game.status, GameStatus.ACTIVE)
+            self.assertIsNotNone(game.mouse_user)
+        self.assertEqual(len(set(Game.objects.values_list("mouse_user", flat=True))), len(games))
+
+    def test3(self):
+        """ No se puede unir uno a sus propias partidas """
+        Game.objects.create(cat_user=self.cat)
+        self.assertIsNone(Game.objects.claim_open_game(self.cat))
+
+    def test4(self):
+        """ Perder muchas carreras no deja sin partida si quedan abiertas """
+        game = Game.objects.create(cat_user=self.cat)
+        claim = GameManager._claim
+        lost = []
+
+        def lose_first(manager, game_id, user):
+            # Las 10 primeras veces otro raton se adelanta
+            if len(lost) < 10:
+                lost.append(game_id)
+                return None
+            return claim(manager, game_id, user)
+
+        with mock.patch.object(connection.features, "has_select_for_update_skip_locked", False), \
+                mock.patch.object(GameManager, "_claim", autospec=True, side_effect=lose_first):
+            claimed = Game.objects.claim_open_game(self.mice[0])
+        self.assertEqual(len(lost), 10)
+        self.assertEqual(claimed.id, game.id)
+
+
+class CounterConcurrencyTests(TransactionTestCase):
+    N_INCS = 50
+    STATE = ("_pending", "_pending_pid", "_last_flush", "_flusher_pid")
+
+    def setUp(self):
+        self.state = {name: getattr(CounterManager, name) for name in self.STATE}
+
+    def tearDown(self):
+        # Ni hilos de escritura ni estado de clase de un test a otro
+        Counter.objects.stop_flusher()
+        for name, value in self.state.items():
+            setattr(CounterManager, name, value)
+
+    def stored(self):
+        return Counter.objects.aggregate(total=Sum("value"))["total"] or 0
+
+    def test1(self):
+        """ Incrementos en paralelo: no se pierde ninguno """
+        def increment(_):
+            for _ in range(self.N_INCS):
+                retry_locked(lambda _: Counter.objects.add(1), None)
+
+        run_in_threads(N_THREADS, increment)
+        self.assertEqual(Counter.objects.get_current_value(), N_THREADS*self.N_INCS)
+        self.assertLessEqual(Counter.objects.count(), N_THREADS)
+
+    @override_settings(COUNTER_FLUSH_INTERVAL=3600)
+    def test2(self):
+        """ Con escritura diferida los incrementos se acumulan en memoria """
+        Counter.objects.flush()
+        for i in range(1, 6):
+            self.assertEqual(Counter.objects.inc(), i)
+        self.assertEqual(self.stored(), 0)
+
+        Counter.objects.flush()
+        self.assertEqual(self.stored(), 5)
+        self.assertEqual(Counter.objects.get_current_value(), 5)
+
+    @override_settings(COUNTER_FLUSH_INTERVAL=3600)
+    def test3(self):
+        """ inc en paralelo con escritura diferida: no se pierde ninguno """
+        Counter.objects.flush()
+
+        # Ninguna escritura durante los incrementos, asi que las lecturas
+        # de inc no chocan con bloqueos de SQLite
+        def increment(_):
+            for _ in range(self.N_INCS):
+                Counter.objects.inc()
+
+        run_in_threads(N_THREADS, increment)
+        self.assertEqual(Counter.objects.get_current_value(), N_THREADS*self.N_INCS)
+        Counter.objects.flush()
+        self.assertEqual(self.stored(), N_THREADS*self.N_INCS)
+
+    @override_settings(COUNTER_FLUSH_INTERVAL=0.2)
+    def test4(self):
+        """ Lo acumulado se escribe aunque no lleguen mas incrementos """
+        Counter.objects.flush()
+        with mock.patch("atexit.register") as register:
+            CounterManager._flusher_pid = None
+            for _ in range(3):
+                Counter.objects.inc()
+        self.assertEqual(self.stored(), 0)
+        register.assert_called_once_with(Counter.objects.flush)
+
+        deadline = time.monotonic() + 5
+        while self.stored() < 3 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.stored(), 3)
+
+        flusher = CounterManager._flusher
+        Counter.objects.stop_flusher()
+        self.assertFalse(flusher.is_alive())
+        self.assertIsNone(CounterManager._flusher_pid)
+
+    @override_settings(COUNTER_FLUSH_INTERVAL=3600)
+    def test5(self):
+        """ Un proceso hijo no vuelve a escribir lo pendiente del padre """
+        Counter.objects.flush()
+        Counter.objects.inc()
+        # Como tras un fork: lo pendiente es una copia del padre
+        with mock.patch("os.getpid", return_value=os.getpid() + 1):
+            self.assertEqual(Counter.objects.get_current_value(), 0)
+            Counter.objects.flush()
+            self.assertEqual(self.stored(), 0)
@@ -0,0 +1,502 @@
+import itertools
+import os
+import random
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from . import ai, batch, board, movelog, packing, replay, rules, tablebase, termination, tests, zobrist
+from .models import Game, GameStatus, Move, PlayerStats
+
+
+class RulesTests(SimpleTestCase):
+    def test1(self):
+        """ Casillas validas del tablero """
+        self.assertEqual(len(rules.cells(rules.DARK)), 32)
+        for cell in [0, 2, 4, 6, 9, 59, 63]:
+            self.assertTrue(rules.valid_cell(cell))
+        for cell in [-1, 1, 7, 26, 44, 56, 62, 64, None, "0"]:
+            self.assertFalse(rules.valid_cell(cell))
+
+    def test2(self):
+        """ Movimientos legales de los gatos respetando los bordes """
+        state = rules.make_state([0, 2, 4, 6], 59)
+        self.assertEqual(sorted(rules.legal_moves(state, rules.CAT)),
+                         [(0, 9), (2, 9), (2, 11), (4, 11), (4, 13),
+                          (6, 13), (6, 15)])
+
+        state = rules.make_state([0, 20, 27, 29], 59)
+        self.assertEqual([m for m in rules.legal_moves(state, rules.CAT)
+                          if m[0] == 20], [])
+
+    def test3(self):
+        """ Movimientos legales del raton respetando los bordes """
+        state = rules.make_state([0, 2, 4, 6], 43, False)
+        self.assertEqual(sorted(rules.legal_moves(state, rules.MOUSE)),
+                         [(43, 34), (43, 36), (43, 50), (43, 52)])
+        state = rules.make_state([0, 2, 4, 6], 63, False)
+        self.assertEqual(rules.legal_moves(state, rules.MOUSE), [(63, 54)])
+        state = rules.make_state([0, 2, 4, 6], 40, False)
+        self.assertEqual(sorted(rules.legal_moves(state, rules.MOUSE)),
+                         [(40, 33), (40, 49)])
+
+    def test4(self):
+        """ Validacion y aplicacion de movimientos segun el turno """
+        state = rules.make_state([0, 2, 4, 6], 59)
+        self.assertTrue(rules.is_legal(state, (0, 9)))
+        self.assertFalse(rules.is_legal(state, (59, 50)))
+        self.assertFalse(rules.is_legal(state, (0, -9)))
+        self.assertFalse(rules.is_legal(state, (9, 18)))
+
+        state = rules.apply(state, (0, 9))
+        self.assertEqual(state, rules.make_state([9, 2, 4, 6], 59, False))
+        self.assertTrue(rules.is_legal(state, (59, 50)))
+        self.assertFalse(rules.is_legal(state, (2, 11)))
+
+        state = rules.apply(state, (59, 50))
+        self.assertEqual(state, rules.make_state([9, 2, 4, 6], 50, True))
+
+    def test5(self):
+        """ Raton encerrado """
+        self.assertTrue(rules.mouse_trapped(
+            rules.make_state([54, 0, 2, 4], 63, False)))
+        self.assertTrue(rules.mouse_trapped(
+            rules.make_state([25, 27, 41, 43], 34, False)))
+        self.assertFalse(rules.mouse_trapped(
+            rules.make_state([25, 27, 41, 2], 34, False)))
+
+
+class BoardTablesTests(SimpleTestCase):
+    def test1(self):
+        """ Tablas de destinos correctas en los bordes """
+        self.assertEqual(board.CAT_TARGETS[0], (9,))
+        self.assertEqual(board.CAT_TARGETS[15], (22,))
+        self.assertEqual(board.CAT_TARGETS[59], ())
+        self.assertEqual(board.MOUSE_TARGETS[16], (9, 25))
+        self.assertEqual(board.MOUSE_TARGETS[63], (54,))
+        self.assertEqual(board.MOUSE_TARGETS[36], (27, 29, 43, 45))
+
+    def test2(self):
+        """ Todos los destinos son casillas oscuras y adyacentes """
+        for cell in board.DARK_CELLS:
+            for target in board.CAT_TARGETS[cell] + board.MOUSE_TARGETS[cell]:
+                self.assertIn(target, board.DARK_CELLS)
+                self.assertEqual(abs(target % 8 - cell % 8), 1)
+            for target in board.CAT_TARGETS[cell]:
+                self.assertIn(target, board.MOUSE_TARGETS[cell])
+
+    def test3(self):
+        """ Tablas inmutables """
+        with self.assertRaises(TypeError):
+            board.CAT_TARGETS[0] = (1,)
+        with self.assertRaises(AttributeError):
+            board.DARK_CELLS.add(1)
+
+
+class TerminationTests(SimpleTestCase):
+    def test1(self):
+        """ Partidas abiertas """
+        self.assertIsNone(termination.winner(rules.make_state([0, 2, 4, 6], 59)))
+        self.assertIsNone(termination.winner(rules.make_state([9, 2, 4, 6], 50, False)))
+
+    def test2(self):
+        """ Raton encerrado: ganan los gatos """
+        state = rules.make_state([54, 0, 2, 4], 63, False)
+        self.assertEqual(termination.winner(state), rules.CAT)
+
+    def test3(self):
+        """ Raton en la fila de salida o por delante de todos los gatos """
+        self.assertEqual(termination.winner(rules.make_state([9, 11, 13, 15], 2)), rules.MOUSE)
+        self.assertEqual(termination.winner(rules.make_state([25, 27, 41, 43], 18)), rules.MOUSE)
+        self.assertEqual(termination.winner(rules.make_state([25, 27, 41, 43], 29, False)), rules.MOUSE)
+        self.assertIsNone(termination.winner(rules.make_state([25, 27, 41, 43], 36, False)))
+
+    def test4(self):
+        """ Gatos sin movimientos en su turno: gana el raton """
+        state = rules.make_state([48, 57, 59, 61], 63, True)
+        self.assertEqual(termination.winner(state), rules.MOUSE)
+
+
+class GameTerminationTests(tests.BaseModelTest):
+    def setUp(self):
+        super().setUp()
+        self.game = Game.objects.create(
+            cat_user=self.users[0], mouse_user=self.users[1], status=GameStatus.ACTIVE)
+
+    def test1(self):
+        """ La partida termina en cuanto el raton deja atras a los gatos """
+        self.game.cat1, self.game.cat2, self.game.cat3, self.game.cat4 = 25, 27, 41, 43
+        self.game.mouse = 36
+        self.game.cat_turn = False
+        self.game.save()
+        self.assertEqual(self.game.status, GameStatus.ACTIVE)
+
+        Move.objects.create(game=self.game, player=self.users[1], origin=36, target=29)
+        self.assertEqual(self.game.status, GameStatus.FINISHED)
+        self.assertEqual(self.game.winner, rules.MOUSE)
+        self.assertEqual(Game.objects.filter(status=GameStatus.ACTIVE).count(), 0)
+
+    def test2(self):
+        """ La partida termina al encerrar al raton """
+        self.game.cat1, self.game.cat2, self.game.cat3, self.game.cat4 = 45, 0, 2, 4
+        self.game.mouse = 63
+        self.game.save()
+
+        Move.objects.create(game=self.game, player=self.users[0], origin=45, target=54)
+        self.assertEqual(self.game.status, GameStatus.FINISHED)
+        self.assertEqual(self.game.winner, rules.CAT)
+
+
+class TablebaseTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmpdir, "tablebase.bin")
+        tablebase.write(cls.path, tablebase.solve())
+        cls.tb = tablebase.Tablebase(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tb.close()
+        shutil.rmtree(cls.tmpdir)
+        super().tearDownClass()
+
+    def test1(self):
+        """ Rango combinatorio biyectivo """
+        ranks = set()
+        for indices in itertools.combinations(range(32), 4):
+            ranks.add(tablebase.rank_cats(indices))
+        self.assertEqual(ranks, set(range(tablebase.N_CAT_SETS)))
+
+    def test2(self):
+        """ Con juego perfecto ganan los gatos desde la posicion inicial """
+        winner, distance = self.tb.lookup(rules.make_state([0, 2, 4, 6], 59))
+        self.assertEqual(winner, rules.CAT)
+        self.assertGreater(distance, 0)
+
+    def test3(self):
+        """ Cada valor es consistente con los de sus sucesores """
+        rnd = random.Random(0)
+        dark = sorted(board.DARK_CELLS)
+        for _ in range(500):
+            pieces = rnd.sample(dark, 5)
+            state = rules.make_state(pieces[:4], pieces[4], rnd.random() < 0.5)
+            winner, distance = self.tb.lookup(state)
+            if termination.winner(state) is not None:
+                self.assertEqual((winner, distance), (termination.winner(state), 0))
+                continue
+
+            side = rules.CAT if state.cat_turn else rules.MOUSE
+            children = [self.tb.lookup(rules.apply(state, move))
+                        for move in rules.legal_moves(state, side)]
+            wins = [d for w, d in children if w == side]
+            if wins:
+                self.assertEqual((winner, distance), (side, min(wins) + 1))
+            else:
+                self.assertNotEqual(winner, side)
+                self.assertEqual(distance, max(d for _, d in children) + 1)
+
+    def test4(self):
+        """ Ficheros no validos """
+        path = os.path.join(self.tmpdir, "bad.bin")
+        with open(path, "wb") as f:
+            f.write(b"XXXX" + bytes(64))
+        with self.assertRaises(tablebase.TablebaseError):
+            tablebase.Tablebase(path)
+
+
+class ZobristTests(SimpleTestCase):
+    def test1(self):
+        """ Actualizacion incremental igual al calculo completo """
+        rnd = random.Random(1)
+        state = rules.make_state([0, 2, 4, 6], 59)
+        key = zobrist.hash_state(state)
+        while termination.winner(state) is None:
+            side = rules.CAT if state.cat_turn else rules.MOUSE
+            move = rnd.choice(rules.legal_moves(state, side))
+            key = zobrist.update(key, state, move)
+            state = rules.apply(state, move)
+            self.assertEqual(key, zobrist.hash_state(state))
+
+    def test2(self):
+        """ Gatos intercambiables y turno incluido en el hash """
+        self.assertEqual(zobrist.hash_state(rules.make_state([0, 2, 4, 6], 59)),
+                         zobrist.hash_state(rules.make_state([6, 4, 2, 0], 59)))
+        self.assertNotEqual(zobrist.hash_state(rules.make_state([0, 2, 4, 6], 59, True)),
+                            zobrist.hash_state(rules.make_state([0, 2, 4, 6], 59, False)))
+
+
+class AITests(SimpleTestCase):
+    def test1(self):
+        """ El bot encuentra la jugada ganadora inmediata """
+        state = rules.make_state([45, 0, 2, 4], 63)
+        self.assertEqual(ai.choose_move(state, 0.2), (45, 54))
+        state = rules.make_state([25, 27, 41, 43], 36, False)
+        self.assertIn(ai.choose_move(state, 0.2), [(36, 27), (36, 29)])
+
+    def test2(self):
+        """ Se respeta el presupuesto de tiempo """
+        searcher = ai.Searcher(time_budget=0.05)
+        start = time.perf_counter()
+        move = searcher.choose(rules.make_state([0, 2, 4, 6], 59))
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertTrue(rules.is_legal(rules.make_state([0, 2, 4, 6], 59), move))
+
+    def test3(self):
+        """ Los mates se guardan como distancia desde el nodo """
+        tt = ai.TranspositionTable(16)
+        tt.store(5, 3, 1, ai.MATE - 4, ai.EXACT, (0, 9))
+        self.assertEqual(tt.probe(5, 1), (1, ai.MATE - 2, ai.EXACT, (0, 9)))
+        tt.store(6, 3, 1, 4 - ai.MATE, ai.UPPER, (0, 9))
+        self.assertEqual(tt.probe(6, 5)[1], 6 - ai.MATE)
+        tt.store(7, 3, 1, 120, ai.LOWER, (0, 9))
+        self.assertEqual(tt.probe(7, 0)[1], 120)
+        # Mismo hueco, otro hash: se sustituye y no se confunde
+        self.assertIsNone(tt.probe(5 + 16, 1))
+        tt.store(5 + 16, 0, 1, 0, ai.EXACT, (2, 11))
+        self.assertIsNone(tt.probe(5, 1))
+        self.assertEqual(len(tt.slots), 16)
+
+    def test4(self):
+        """ La tabla se reutiliza entre movimientos sin cambiar la jugada """
+        tt = ai.TranspositionTable(1 << 10)
+        state = rules.make_state([45, 0, 2, 4], 63)
+        for _ in range(3):
+            self.assertEqual(ai.Searcher(0.2, tt=tt).choose(state), (45, 54))
+        self.assertLessEqual(len(tt.slots), 1 << 10)
+
+
+class BatchValidationTests(SimpleTestCase):
+    def test1(self):
+        """ Mismo resultado que el motor de reglas movimiento a movimiento """
+        rnd = random.Random(2)
+        dark = sorted(board.DARK_CELLS)
+        rows = []
+        for _ in range(2000):
+            pieces = rnd.sample(dark, 5)
+            cat_turn = rnd.random() < 0.5
+            origin = rnd.choice(pieces) if rnd.random() < 0.9 else rnd.randrange(64)
+            target = origin + rnd.choice([-9, -7, 7, 9, 0, 2])
+            rows.append((pieces[:4], pieces[4], cat_turn, origin, target))
+
+        legal, cats, mouse, cat_turn = batch.validate_moves(
+            [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows],
+            [r[3] for r in rows], [r[4] for r in rows])
+
+        for i, (c, m, turn, origin, target) in enumerate(rows):
+            state = rules.make_state(c, m, turn)
+            expected = rules.is_legal(state, (origin, target))
+            self.assertEqual(bool(legal[i]), expected)
+            if expected:
+                state = rules.apply(state, (origin, target))
+            self.assertEqual(rules.make_state(cats[i], mouse[i], cat_turn[i]), state)
+
+    def test2(self):
+        """ Casillas fuera del tablero """
+        legal, _, _, _ = batch.validate_moves(
+            [[0, 2, 4, 6]]*3, [59]*3, [True, True, False], [0, 6, 59], [-1, 64, 68])
+        self.assertFalse(legal.any())
+
+
+class GameZobristTests(tests.BaseModelTest):
+    def setUp(self):
+        super().setUp()
+        self.game = Game.objects.create(
+            cat_user=self.users[0], mouse_user=self.users[1], status=GameStatus.ACTIVE)
+
+    def test1(self):
+        """ Hash guardado, actualizado en cada movimiento e igual al recalculado """
+        self.assertEqual(self.game.position_hash(), zobrist.hash_state(self.game.state()))
+        Move.objects.create(game=self.game, player=self.users[0], origin=0, target=9)
+        Move.objects.create(game=self.game, player=self.users[1], origin=59, target=50)
+
+        game = Game.objects.get(id=self.game.id)
+        self.assertEqual(game.zobrist, self.game.zobrist)
+        self.assertEqual(game.position_hash(), zobrist.hash_state(game.state()))
+
+    def test2(self):
+        """ Posiciones iguales en partidas distintas con una sola consulta """
+        other = Game.objects.create(
+            cat_user=self.users[1], mouse_user=self.users[0], status=GameStatus.ACTIVE)
+        Move.objects.create(game=other, player=self.users[1], origin=0, target=9)
+        self.assertEqual(Game.objects.filter(zobrist=self.game.zobrist).count(), 1)
+
+        self.game.cat1 = 9
+        self.game.cat_turn = False
+        self.game.save()
+        self.assertEqual(Game.objects.filter(zobrist=self.game.zobrist).count(), 2)
+
+    def test3(self):
+        """ Una partida leida de la base de datos actualiza el hash sin recalcularlo """
+        game = Game.objects.get(id=self.game.id)
+        with mock.patch.object(zobrist, "hash_state", wraps=zobrist.hash_state) as hash_state:
+            Move.objects.create(game=game, player=self.users[0], origin=0, target=9)
+            game = Game.objects.get(id=self.game.id)
+            Move.objects.create(game=game, player=self.users[1], origin=59, target=50)
+        hash_state.assert_not_called()
+        self.assertEqual(Game.objects.get(id=self.game.id).position_hash(),
+                         zobrist.hash_state(game.state()))
+
+        # Sin alguno de sus campos no se fia del hash leido
+        game = Game.objects.defer("zobrist").get(id=self.game.id)
+        self.assertIsNone(game._zobrist_state)
+
+    def test4(self):
+        """ Partidas leidas sin algunos campos: sin recursion y con estadisticas correctas """
+        self.assertEqual([game.id for game in Game.objects.only("id")], [self.game.id])
+        game = Game.objects.defer("status").get(id=self.game.id)
+        self.assertIs(game._stats_key, Game.STATS_UNKNOWN)
+        self.assertEqual(game.status, GameStatus.ACTIVE)
+
+        game = Game.objects.defer("status").get(id=self.game.id)
+        game.status = GameStatus.FINISHED
+        game.winner = rules.CAT
+        game.save()
+        self.assertEqual(PlayerStats.objects.get(user=self.users[0]).won_as_cat, 1)
+        self.assertEqual(PlayerStats.objects.inconsistencies(), [])
+
+
+class PackingTests(SimpleTestCase):
+    def test1(self):
+        """ Empaquetar y desempaquetar todas las casillas """
+        dark = sorted(board.DARK_CELLS)
+        rnd = random.Random(3)
+        for _ in range(500):
+            pieces = rnd.sample(dark, 5)
+            cat_turn = rnd.random() < 0.5
+            value = packing.pack(pieces[:4], pieces[4], cat_turn)
+            self.assertLess(value, 1 << 63)
+            self.assertEqual(packing.unpack(value), (sorted(pieces[:4]), pieces[4], cat_turn))
+            self.assertEqual(packing.pack_state(rules.make_state(pieces[:4], pieces[4], cat_turn)),
+                             value)
+
+    def test2(self):
+        """ Valor canonico: el orden de los gatos no importa """
+        self.assertEqual(packing.pack([0, 2, 4, 6], 59, True), packing.pack([6, 4, 0, 2], 59, True))
+        self.assertNotEqual(packing.pack([0, 2, 4, 6], 59, True), packing.pack([0, 2, 4, 6], 59, False))
+
+
+class GamePackedStateTests(tests.BaseModelTest):
+    def test1(self):
+        """ Columna empaquetada al crear la partida y al mover """
+        game = Game.objects.create(
+            cat_user=self.users[0], mouse_user=self.users[1], status=GameStatus.ACTIVE)
+        self.assertEqual(packing.unpack(game.packed_state), ([0, 2, 4, 6], 59, True))
+
+        Move.objects.create(game=game, player=self.users[0], origin=2, target=11)
+        value = Game.objects.values_list("packed_state", flat=True).get(id=game.id)
+        self.assertEqual(packing.unpack(value), ([0, 4, 6, 11], 59, False))
+
+
+@override_settings(REPLAY_SNAPSHOT_INTERVAL=4)
+class ReplayTests(tests.BaseModelTest):
+    def setUp(self):
+        super().setUp()
+        self.game = Game.objects.create(
+            cat_user=self.users[0], mouse_user=self.users[1], status=GameStatus.ACTIVE)
+        self.states = [self.game.state()]
+        moves = [(0, 9), (59, 50), (2, 11), (50, 41), (4, 13), (41, 32),
+                 (6, 15), (32, 25), (9, 16), (25, 34), (11, 20)]
+        for origin, target in moves:
+            player = self.users[0] if self.game.cat_turn else self.users[1]
+            Move.objects.create(game=self.game, player=player, origin=origin, target=target)
+            self.states.append(self.game.state())
+
+    def test1(self):
+        """ Fotos cada REPLAY_SNAPSHOT_INTERVAL movimientos """
+        self.assertEqual(self.game.move_count, 11)
+        self.assertEqual(list(self.game.snapshots.order_by("index").values_list("index", flat=True)),
+                         [0, 4, 8])
+
+    def test2(self):
+        """ Posicion en cualquier movimiento del historial """
+        for index, state in enumerate(self.states):
+            self.assertEqual(replay.position_at(self.game, index), state)
+        self.assertEqual(replay.history(self.game), self.states)
+        with self.assertRaises(ValueError):
+            replay.position_at(self.game, 12)
+
+    def test3(self):
+        """ Reconstruccion de una partida corrupta a partir de su registro """
+        Game.objects.filter(id=self.game.id).update(cat1=0, cat2=2, mouse=63, cat_turn=True, move_count=0)
+        game = replay.rebuild_game(Game.objects.get(id=self.game.id))
+        self.assertEqual(game.state(), self.states[-1])
+        self.assertEqual(game.move_count, 11)
+        self.assertEqual(game.zobrist, self.game.zobrist)
+
+    def test4(self):
+        """ La corrupcion anterior a una foto no se copia al reconstruir """
+        # Posicion corrupta desde antes del movimiento 4: las fotos 4 y 8
+        # y la partida la han ido copiando
+        corrupt = rules.make_state([0, 2, 4, 6], 63, True)
+        self.game.snapshots.filter(index__gt=0).update(packed_state=packing.pack_state(corrupt))
+        Game.objects.filter(id=self.game.id).update(cat1=0, cat2=2, cat3=4, cat4=6, mouse=63,
+                                                    cat_turn=True, zobrist=0)
+
+        game = replay.rebuild_game(Game.objects.get(id=self.game.id))
+        self.assertEqual(game.state(), self.states[-1])
+        self.assertEqual(Game.objects.get(id=self.game.id).zobrist, self.game.zobrist)
+        for index, state in enumerate(self.states):
+            self.assertEqual(replay.position_at(game, index), state)
+
+
+class MoveLogTests(SimpleTestCase):
+    def test1(self):
+        """ Codificar y decodificar movimientos en todas las direcciones """
+        moves = [(cell, target) for cell in sorted(board.DARK_CELLS)
+                 for target in board.CAT_TARGETS[cell] + board.MOUSE_TARGETS[cell]]
+        self.assertEqual(movelog.decode(movelog.encode(moves)), moves)
+        self.assertEqual(movelog.decode(movelog.encode([])), [])
+
+    def test2(self):
+        """ Solo se codifican movimientos diagonales """
+        with self.assertRaises(ValueError):
+            movelog.encode([(0, 18)])
+
+    def test3(self):
+        """ Registro empaquetado: un byte por casilla y tiempos diferenciales """
+        items = [(0, 9, False, 1600000000000), (59, 50, True, 1600000000250),
+                 (9, 16, False, 1600000090250)]
+        log = movelog.pack_entries(items)
+        self.assertEqual(list(movelog.entries(log)), items)
+        self.assertEqual(len(log), 2*3 + 6 + 2 + 3)
+
+        appended = b""
+        for item in items:
+            appended = movelog.append_entry(appended, *item)
+        self.assertEqual(appended, log)
+        self.assertEqual(list(movelog.entries(b"")), [])
+
+
+@override_settings(MOVE_STORAGE="packed")
+class PackedMovesTests(tests.BaseModelTest):
+    def setUp(self):
+        super().setUp()
+        self.game = Game.objects.create(
+            cat_user=self.users[0], mouse_user=self.users[1], status=GameStatus.ACTIVE)
+        self.moves = [(0, 9), (59, 50), (2, 11), (50, 41), (4, 13)]
+        for origin, target in self.moves:
+            player = self.users[0] if self.game.cat_turn else self.users[1]
+            Move.objects.create(game=self.game, player=player, origin=origin, target=target)
+
+    def test1(self):
+        """ Los movimientos van al registro de la partida, no a filas Move """
+        self.assertFalse(Move.objects.filter(game=self.game).exists())
+        game = Game.objects.get(id=self.game.id)
+        self.assertEqual(len(bytes(game.move_log)), 5*2 + 6 + 4*1)
+        self.assertEqual(game.moves.count(), 5)
+
+    def test2(self):
+        """ game.moves sigue funcionando con el registro empaquetado """
+        game = Game.objects.get(id=self.game.id)
+        self.assertEqual(game.moves.order_by("id").values_list("origin", "target"), self.moves)
+        self.assertEqual(game.moves.filter(player=self.users[1]).count(), 2)
+        self.assertEqual(game.moves.order_by("-id").first().origin, 4)
+        dates = game.moves.values_list("date", flat=True)
+        self.assertEqual(dates, sorted(dates))
+        self.assertEqual(replay.history(game)[-1], game.state())
+        self.assertEqual(replay.position_at(game, 2), replay.history(game)[2])
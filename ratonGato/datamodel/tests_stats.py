@@ -0,0 +1,99 @@
+import os
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+
+from . import archive, bot, rules, tests
+from .models import Game, GameStatus, PlayerStats
+
+
+class PlayerStatsTests(tests.BaseModelTest):
+    def stats(self, user):
+        row = PlayerStats.objects.filter(user=user).values_list(*PlayerStats.objects.FIELDS).first()
+        return row or (0, 0, 0, 0)
+
+    def test1(self):
+        """ Las estadisticas siguen los cambios de estado de las partidas """
+        cat, mouse = self.users
+        game = Game.objects.create(cat_user=cat)
+        self.assertEqual(self.stats(cat), (0, 0, 0, 0))
+
+        game = Game.objects.claim_open_game(mouse)
+        self.assertEqual(self.stats(cat), (0, 1, 0, 0))
+        self.assertEqual(self.stats(mouse), (0, 1, 0, 0))
+
+        game.status = GameStatus.FINISHED
+        game.winner = rules.MOUSE
+        game.save()
+        self.assertEqual(self.stats(cat), (1, 0, 0, 0))
+        self.assertEqual(self.stats(mouse), (1, 0, 0, 1))
+
+        # Guardar sin cambiar de estado no vuelve a contar la partida
+        game.save()
+        Game.objects.get(id=game.id).save()
+        self.assertEqual(self.stats(mouse), (1, 0, 0, 1))
+
+        Game.objects.create(cat_user=cat, mouse_user=mouse, status=GameStatus.FINISHED,
+                            winner=rules.CAT)
+        self.assertEqual(self.stats(cat), (2, 0, 1, 0))
+        self.assertEqual(PlayerStats.objects.inconsistencies(), [])
+
+    def test2(self):
+        """ Comprobacion y reconstruccion de las estadisticas """
+        cat, mouse = self.users
+        Game.objects.create(cat_user=cat, mouse_user=mouse)
+        Game.objects.create(cat_user=mouse, mouse_user=cat, status=GameStatus.FINISHED,
+                            winner=rules.CAT)
+        call_command("check_player_stats", stdout=StringIO())
+
+        PlayerStats.objects.filter(user=cat).update(played=7)
+        PlayerStats.objects.filter(user=mouse).delete()
+        with self.assertRaisesRegex(CommandError, "2 players"):
+            call_command("check_player_stats", stdout=StringIO())
+
+        out = StringIO()
+        call_command("rebuild_player_stats", stdout=out)
+        self.assertIn("2 players", out.getvalue())
+        self.assertEqual(self.stats(cat), (1, 1, 0, 0))
+        self.assertEqual(self.stats(mouse), (1, 1, 1, 0))
+        call_command("check_player_stats", stdout=StringIO())
+
+    def test3(self):
+        """ Las partidas archivadas siguen contando """
+        cat, mouse = self.users
+        Game.objects.create(cat_user=cat, mouse_user=mouse, status=GameStatus.FINISHED,
+                            winner=rules.MOUSE)
+        archive.archive_finished(before=timezone.now() + timedelta(days=1))
+        self.assertFalse(Game.objects.exists())
+        self.assertEqual(self.stats(mouse), (1, 0, 0, 1))
+        self.assertEqual(PlayerStats.objects.inconsistencies(), [])
+
+    @override_settings(MOVE_STORAGE="packed")
+    def test4(self):
+        """ Las partidas de simulate insertadas con bulk_create cuentan """
+        # Se fuerza la rama de bases de datos que devuelven los ids del
+        # insert masivo (PostgreSQL); el bulk_create falso guarda las filas
+        # sin pasar por Game.save, como el de verdad. Con los movimientos
+        # empaquetados no hace falta insertar filas Move
+        def bulk_create(games):
+            for game in games:
+                game.save_base(raw=True)
+            return games
+
+        with mock.patch.object(connection.features, "can_return_ids_from_bulk_insert", True), \
+                mock.patch.object(Game.objects, "bulk_create", side_effect=bulk_create) as fake:
+            call_command("simulate", 6, workers=1, output=os.devnull, sample=4, stdout=StringIO())
+        self.assertTrue(fake.called)
+
+        player = bot.get_bot_user()
+        games = Game.objects.filter(cat_user=player)
+        wins = {side: games.filter(winner=side).count() for side in (rules.CAT, rules.MOUSE)}
+        self.assertEqual(self.stats(player), (8, 0, wins[rules.CAT], wins[rules.MOUSE]))
+        self.assertEqual(PlayerStats.objects.inconsistencies(), [])
+        call_command("check_player_stats", stdout=StringIO())
@@ -0,0 +1,40 @@
+# Hash Zobrist de 64 bits de una posicion (conjunto de gatos, raton y
+# turno). Las claves se generan con una semilla fija para que el hash sea
+# estable entre procesos y ejecuciones.
+
+import random
+
+from datamodel import rules
+from datamodel.board import N_CELLS
+
+_rnd = random.Random(0x526174676174)
+CAT_KEYS = tuple(_rnd.getrandbits(64) for _ in range(N_CELLS))
+MOUSE_KEYS = tuple(_rnd.getrandbits(64) for _ in range(N_CELLS))
+CAT_TURN_KEY = _rnd.getrandbits(64)
+del _rnd
+
+
+def to_signed(h):
+    # Los BIGINT de la base de datos son con signo
+    return h - (1 << 64) if h >= (1 << 63) else h
+
+
+def to_unsigned(h):
+    return h & ((1 << 64) - 1)
+
+
+def hash_state(state):
+    h = 0
+    for cat in rules.cells(state.cats):
+        h ^= CAT_KEYS[cat]
+    h ^= MOUSE_KEYS[state.mouse.bit_length() - 1]
+    if state.cat_turn:
+        h ^= CAT_TURN_KEY
+    return h
+
+
+def update(h, state, move):
+    # Hash tras aplicar 'move' sobre 'state' sin recalcularlo entero
+    origin, target = move
+    keys = CAT_KEYS if state.cat_turn else MOUSE_KEYS
+    return h ^ keys[origin] ^ keys[target] ^ CAT_TURN_KEY
@@ -0,0 +1,54 @@
+import threading
+
+from django.core.cache import caches
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+from datamodel import packing
+from logic import board_html
+
+# Hits and misses of this process, reported by the metrics service
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def board_list(game):
+    # 0 for empty cells, 1 for cats and -1 for the mouse
+    board = [0]*64
+    for cat in game.pos_gatos():
+        board[cat] = 1
+    board[game.pos_raton()[0]] = -1
+    return board
+
+
+def cache_key(game):
+    # The fragment only depends on where the pieces are: the packed
+    # position without the turn, computed from the current cells
+    return 'board:%d' % packing.pack(game.pos_gatos(), int(game.mouse),
+                                     False)
+
+
+def render_board(game):
+    # HTML of the board of 'game', rendered only on a cache miss
+    cache = caches[settings.BOARD_CACHE]
+    key = cache_key(game)
+    html = cache.get(key)
+    with _lock:
+        _stats['hits' if html is not None else 'misses'] += 1
+    if html is None:
+        html = board_html.render(board_list(game))
+        cache.set(key, html, None)
+    return mark_safe(html)
+
+
+def stats():
+    with _lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {'hits': hits, 'misses': misses,
+            'hit_ratio': hits / total if total else None}
+
+
+def reset_stats():
+    with _lock:
+        _stats['hits'] = _stats['misses'] = 0
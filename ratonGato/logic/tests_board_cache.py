@@ -0,0 +1,83 @@
+import random
+
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.test import override_settings
+from django.urls import reverse
+
+from datamodel.models import Game, GameStatus
+from logic import board_cache, board_html
+
+from .tests_services import PlayGameBaseServiceTests, MOVE_SERVICE, SHOW_GAME_SERVICE
+
+METRICS_SERVICE = "metrics"
+
+
+class BoardCacheTests(PlayGameBaseServiceTests):
+    def setUp(self):
+        super().setUp()
+        caches["boards"].clear()
+        board_cache.reset_stats()
+        self.game = Game.objects.create(cat_user=self.user1, mouse_user=self.user2,
+                                        status=GameStatus.ACTIVE)
+        self.set_game_in_session(self.client1, self.user1, self.game.id)
+        self.set_game_in_session(self.client2, self.user2, self.game.id)
+
+    def tearDown(self):
+        super().tearDown()
+
+    def metrics(self):
+        return self.client1.get(reverse(METRICS_SERVICE)).json()["board_cache"]
+
+    def test1(self):
+        """ La misma posicion solo se dibuja una vez para todos los jugadores """
+        html = self.decode(self.client1.get(reverse(SHOW_GAME_SERVICE)).content)
+        self.assertEqual(self.decode(self.client2.get(reverse(SHOW_GAME_SERVICE)).content).count("cell_"),
+                         html.count("cell_"))
+        self.assertEqual(self.metrics(), {"hits": 1, "misses": 1, "hit_ratio": 0.5})
+
+        # Otra partida en la misma posicion usa el mismo fragmento
+        other = Game.objects.create(cat_user=self.user2, mouse_user=self.user1,
+                                    status=GameStatus.ACTIVE)
+        board_cache.render_board(other)
+        self.assertEqual(self.metrics()["hits"], 2)
+
+    def test2(self):
+        """ Cada posicion tiene su fragmento, que coincide con el de la plantilla """
+        before = board_cache.render_board(self.game)
+        self.client1.post(reverse(MOVE_SERVICE), {"origin": 0, "target": 9})
+        game = Game.objects.get(id=self.game.id)
+        after = board_cache.render_board(game)
+        self.assertNotEqual(before, after)
+        self.assertIn('<td id="cell_9"" style=\'width:20px;border:1px solid #000000;text-align:center;\'>\n'
+                      '          &#9922;', after)
+        self.assertIn("Board: %s" % board_cache.board_list(game), after)
+        self.assertEqual(self.metrics()["misses"], 2)
+
+    @override_settings(CACHES={"boards": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "boards_lru", "OPTIONS": {"MAX_ENTRIES": 2, "CULL_FREQUENCY": 2}}})
+    def test3(self):
+        """ Con la cache llena se descartan los fragmentos menos usados """
+        games = [Game(cat1=0, cat2=2, cat3=4, cat4=6, mouse=mouse) for mouse in (57, 59, 61)]
+        board_cache.render_board(games[0])
+        board_cache.render_board(games[1])
+        board_cache.render_board(games[0])
+        board_cache.render_board(games[2])
+        board_cache.reset_stats()
+
+        board_cache.render_board(games[0])
+        board_cache.render_board(games[1])
+        self.assertEqual(self.metrics(), {"hits": 1, "misses": 1, "hit_ratio": 0.5})
+
+    def test4(self):
+        """ El dibujo precompilado coincide con la plantilla board.html """
+        rnd = random.Random(0)
+        for _ in range(50):
+            board = [0] * 64
+            cells = rnd.sample(range(64), 5)
+            for cell in cells[:4]:
+                board[cell] = 1
+            board[cells[4]] = -1
+            self.assertEqual(board_html.render(board),
+                             render_to_string("mouse_cat/board.html", {"board": board}))
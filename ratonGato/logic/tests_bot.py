@@ -0,0 +1,80 @@
+from unittest import mock
+
+from django.db import IntegrityError
+from django.test import override_settings
+from django.urls import reverse
+
+from datamodel import bot, constants
+from datamodel.models import Game, GameStatus, Move
+
+from .tests_services import PlayGameBaseServiceTests, SHOW_GAME_SERVICE, MOVE_SERVICE
+
+CREATE_BOT_GAME_SERVICE = "create_bot_game"
+
+
+@override_settings(BOT_TIME_BUDGET=0.05)
+class BotGameServiceTests(PlayGameBaseServiceTests):
+    def setUp(self):
+        super().setUp()
+
+    def tearDown(self):
+        self.user1.games_as_mouse.all().delete()
+        super().tearDown()
+
+    def test1(self):
+        """ Solo puede invocarse por usuarios autenticados """
+        self.logoutTestUser(self.client1)
+        response = self.client1.get(
+            reverse(CREATE_BOT_GAME_SERVICE, kwargs={'side': 'cat'}), follow=True)
+        self.is_login(response)
+
+    def test2(self):
+        """ Partida contra el bot como gato: el bot responde a cada movimiento """
+        self.loginTestUser(self.client1, self.user1)
+        response = self.client1.get(
+            reverse(CREATE_BOT_GAME_SERVICE, kwargs={'side': 'cat'}), follow=True)
+        game = Game.objects.get(id=self.client1.session[constants.GAME_SELECTED_SESSION_ID])
+        self.is_play_game(response, game)
+        self.assertEqual(game.cat_user, self.user1)
+        self.assertEqual(game.status, GameStatus.ACTIVE)
+        self.assertTrue(game.cat_turn)
+
+        self.client1.post(reverse(MOVE_SERVICE), {"origin": 0, "target": 9}, follow=True)
+        game = Game.objects.get(id=game.id)
+        self.assertEqual(game.moves.count(), 2)
+        self.assertTrue(game.cat_turn)
+        self.assertEqual(Move.objects.filter(game=game, player=game.mouse_user).count(), 1)
+
+    def test3(self):
+        """ Partida contra el bot como raton: el bot mueve primero """
+        self.loginTestUser(self.client1, self.user1)
+        self.client1.get(reverse(CREATE_BOT_GAME_SERVICE, kwargs={'side': 'mouse'}), follow=True)
+        game = Game.objects.get(id=self.client1.session[constants.GAME_SELECTED_SESSION_ID])
+        self.assertEqual(game.mouse_user, self.user1)
+        self.assertFalse(game.cat_turn)
+        self.assertEqual(game.moves.count(), 1)
+
+        response = self.client1.get(reverse(SHOW_GAME_SERVICE), follow=True)
+        self.is_play_game_moving(response, game)
+
+    def test4(self):
+        """ Bando no valido """
+        self.loginTestUser(self.client1, self.user1)
+        response = self.client1.get(
+            reverse(CREATE_BOT_GAME_SERVICE, kwargs={'side': 'dog'}), follow=True)
+        self.assertEqual(response.status_code, 404)
+
+    def test5(self):
+        """ El movimiento del bot se guarda entero o no se guarda """
+        game = Game.objects.create(cat_user=bot.get_bot_user(), mouse_user=self.user1,
+                                   status=GameStatus.ACTIVE)
+        with mock.patch.object(Move, "save_base", side_effect=IntegrityError), \
+                self.assertRaises(IntegrityError):
+            bot.play(Game.objects.get(id=game.id))
+        game = Game.objects.get(id=game.id)
+        self.assertEqual((game.move_count, game.cat_turn), (0, True))
+        self.assertEqual(game.pos_gatos(), [0, 2, 4, 6])
+
+        move = bot.play(game)
+        self.assertEqual(move.game.move_count, 1)
+        self.assertEqual(Game.objects.get(id=game.id).moves.count(), 1)
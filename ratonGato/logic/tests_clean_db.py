@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from django.urls import reverse
+from django.utils import timezone
+
+from datamodel.models import Game, GameStatus
+
+from .tests_services import GameRequiredBaseServiceTests, CLEAN_SERVICE
+
+
+class CleanDbServiceTests(GameRequiredBaseServiceTests):
+    def setUp(self):
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+
+    def test1(self):
+        """ Solo puede invocarse por usuarios autenticados """
+        self.validate_login_required(self.client1, CLEAN_SERVICE)
+
+    def test2(self):
+        """ Se borran solo las partidas sin raton antiguas """
+        old = timezone.now() - timedelta(days=2)
+        orphans = [Game.objects.create(cat_user=self.user1) for _ in range(3)]
+        recent = Game.objects.create(cat_user=self.user1)
+        joined = Game.objects.create(cat_user=self.user1, mouse_user=self.user2)
+        Game.objects.filter(id__in=[g.id for g in orphans] + [joined.id]).update(created=old)
+
+        self.user1.is_staff = True
+        self.user1.save()
+        self.loginTestUser(self.client1, self.user1)
+        # GET solo pide confirmacion
+        response = self.client1.get(reverse(CLEAN_SERVICE))
+        self.assertRegex(self.decode(response.content), r"<b>3</b> games nobody joined")
+        self.assertEqual(Game.objects.filter(id__in=[g.id for g in orphans]).count(), 3)
+
+        response = self.client1.post(reverse(CLEAN_SERVICE), follow=True)
+        self.is_clean_db(response, 3)
+        self.assertFalse(Game.objects.filter(id__in=[g.id for g in orphans]).exists())
+        self.assertEqual(Game.objects.filter(id__in=[recent.id, joined.id]).count(), 2)
+        self.assertEqual(Game.objects.get(id=joined.id).status, GameStatus.ACTIVE)
+
+        response = self.client1.post(reverse(CLEAN_SERVICE), follow=True)
+        self.is_clean_db(response, 0)
+
+    def test3(self):
+        """ Solo el personal puede borrar partidas """
+        orphan = Game.objects.create(cat_user=self.user1)
+        Game.objects.filter(id=orphan.id).update(created=timezone.now() - timedelta(days=2))
+        self.loginTestUser(self.client1, self.user1)
+        self.assertEqual(self.client1.get(reverse(CLEAN_SERVICE)).status_code, 403)
+        self.assertEqual(self.client1.post(reverse(CLEAN_SERVICE)).status_code, 403)
+        self.assertTrue(Game.objects.filter(id=orphan.id).exists())
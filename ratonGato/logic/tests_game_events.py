@@ -0,0 +1,176 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from datamodel import pubsub
+from datamodel.models import Game, GameStatus
+
+from .tests_services import PlayGameBaseServiceTests, MOVE_SERVICE
+
+GAME_EVENTS_SERVICE = "game_events"
+
+
+def events(chunks):
+    # Eventos (id, datos) de los fragmentos de un flujo SSE
+    for chunk in chunks:
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        fields = dict(line.split(": ", 1) for line in chunk.splitlines()
+                      if line and not line.startswith(":"))
+        if "data" in fields:
+            yield int(fields["id"]), json.loads(fields["data"])
+
+
+@override_settings(SSE_KEEPALIVE_SECONDS=0.05, SSE_STREAM_SECONDS=5)
+class GameEventsServiceTests(PlayGameBaseServiceTests):
+    def setUp(self):
+        super().setUp()
+        self.game = Game.objects.create(cat_user=self.user1,
+                                        mouse_user=self.user2,
+                                        status=GameStatus.ACTIVE)
+        self.set_game_in_session(self.client1, self.user1, self.game.id)
+        self.set_game_in_session(self.client2, self.user2, self.game.id)
+
+    def tearDown(self):
+        super().tearDown()
+
+    def stream(self, client, **headers):
+        response = client.get(reverse(GAME_EVENTS_SERVICE, args=[self.game.id]), **headers)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return response, events(response.streaming_content)
+
+    def move(self, client, origin, target):
+        client.post(reverse(MOVE_SERVICE), {"origin": origin, "target": target})
+
+    def test1(self):
+        """ El flujo envia el estado actual y despues cada movimiento """
+        response, stream = self.stream(self.client2)
+        self.assertEqual(next(stream), (0, self.game.event()))
+
+        self.move(self.client1, 0, 9)
+        move, event = next(stream)
+        self.assertEqual(move, 1)
+        self.assertEqual(event["cats"], [9, 2, 4, 6])
+        self.assertFalse(event["cat_turn"])
+
+        self.move(self.client2, 59, 50)
+        self.assertEqual(next(stream)[1]["mouse"], 50)
+        response.close()
+
+    def test2(self):
+        """ Jugadores y espectadores comparten los mismos eventos """
+        streams = [self.stream(client) for client in (self.client1, self.client2, self.client1)]
+        for _, stream in streams:
+            next(stream)
+        self.move(self.client1, 0, 9)
+        self.assertEqual([next(stream)[0] for _, stream in streams], [1, 1, 1])
+        for response, _ in streams:
+            response.close()
+
+    def test3(self):
+        """ Al reconectar con Last-Event-ID no se repite el estado ya visto """
+        self.move(self.client1, 0, 9)
+        _, stream = self.stream(self.client2, HTTP_LAST_EVENT_ID="1")
+        self.move(self.client2, 59, 50)
+        self.assertEqual(next(stream)[0], 2)
+
+    def test4(self):
+        """ El flujo termina con la partida """
+        self.game.status = GameStatus.FINISHED
+        self.game.save()
+        _, stream = self.stream(self.client2)
+        self.assertEqual(next(stream)[1]["status"], GameStatus.FINISHED)
+        self.assertRaises(StopIteration, next, stream)
+
+        response = self.client1.get(reverse(GAME_EVENTS_SERVICE, args=[self.game.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    def test5(self):
+        """ Una respuesta que no llega a recorrerse no deja suscripciones """
+        response, _ = self.stream(self.client2)
+        response.close()
+        if isinstance(pubsub.get_pubsub(), pubsub.MemoryPubSub):
+            self.assertEqual(pubsub.get_pubsub().subscribers, {})
+
+    def test6(self):
+        """ El ultimo movimiento llega aunque se descarte el canal """
+        Game.objects.filter(id=self.game.id).update(cat1=50, cat2=45, mouse=63)
+        _, stream = self.stream(self.client2)
+        next(stream)
+        self.move(self.client1, 45, 54)
+        self.assertEqual(next(stream)[1]["status"], GameStatus.FINISHED)
+        self.assertRaises(StopIteration, next, stream)
+
+
+class FileGameEventsServiceTests(GameEventsServiceTests):
+    # Los mismos casos con el backend de ficheros para varios procesos
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.settings = override_settings(PUBSUB={
+            "BACKEND": "datamodel.pubsub.FilePubSub",
+            "OPTIONS": {"path": self.tmpdir, "poll_interval": 0.01}})
+        self.settings.enable()
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        self.settings.disable()
+        shutil.rmtree(self.tmpdir)
+
+    def test5(self):
+        """ Una respuesta que no llega a recorrerse no abre el canal """
+        super().test5()
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test6(self):
+        """ El fichero del canal se borra al terminar la partida """
+        super().test6()
+        self.assertEqual(os.listdir(self.tmpdir), [])
+        # y no se vuelve a crear al seguir una partida terminada
+        self.assertEqual(len(list(self.stream(self.client2)[1])), 1)
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+
+class FilePubSubTests(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test1(self):
+        """ Cada proceso (instancia) lee lo publicado por los demas """
+        publisher = pubsub.FilePubSub(self.tmpdir)
+        reader = pubsub.FilePubSub(self.tmpdir, poll_interval=0.01)
+        publisher.publish("c", "old")
+        with reader.subscribe("c") as subscription:
+            self.assertIsNone(subscription.get(0.02))
+            publisher.publish("c", "a")
+            publisher.publish("other", "x")
+            publisher.publish("c", "b")
+            self.assertEqual([subscription.get(1), subscription.get(1)], ["a", "b"])
+
+            # Las lineas a medio escribir se leen cuando se completan
+            with open(publisher._file("c"), "a") as log:
+                log.write("par")
+            self.assertIsNone(subscription.get(0.02))
+            with open(publisher._file("c"), "a") as log:
+                log.write("tial\n")
+            self.assertEqual(subscription.get(1), "partial")
+
+        self.assertRaises(ValueError, publisher.publish, "c", "two\nlines")
+
+    def test2(self):
+        """ Al descartar el canal se borra su fichero, pero quien lo tenia
+        abierto termina de leerlo """
+        pubsub_ = pubsub.FilePubSub(self.tmpdir, poll_interval=0.01)
+        with pubsub_.subscribe("c") as early:
+            pubsub_.publish("c", "a")
+            self.assertEqual(early.get(1), "a")
+            pubsub_.publish("c", "last")
+            pubsub_.discard("c")
+            self.assertEqual(os.listdir(self.tmpdir), [])
+            self.assertEqual(early.get(1), "last")
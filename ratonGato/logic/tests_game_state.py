@@ -0,0 +1,63 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from datamodel import constants
+from datamodel.models import Game, GameStatus
+
+from .tests_services import PlayGameBaseServiceTests, MOVE_SERVICE
+
+GAME_STATE_SERVICE = "game_state"
+# Consultas de una peticion sin cambios: sesion, usuario y el estado de
+# la partida por su clave primaria
+NOT_MODIFIED_QUERIES = 3
+
+
+class GameStateServiceTests(PlayGameBaseServiceTests):
+    def setUp(self):
+        super().setUp()
+        self.game = Game.objects.create(cat_user=self.user1,
+                                        mouse_user=self.user2,
+                                        status=GameStatus.ACTIVE)
+        self.set_game_in_session(self.client1, self.user1, self.game.id)
+
+    def tearDown(self):
+        super().tearDown()
+
+    def get_state(self, **headers):
+        return self.client1.get(reverse(GAME_STATE_SERVICE), **headers)
+
+    def test1(self):
+        """ Estado de la partida seleccionada con su ETag """
+        response = self.get_state()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), self.game.event())
+        self.assertEqual(response["ETag"], '"%d-0-%d"' % (self.game.id, GameStatus.ACTIVE))
+
+    def test2(self):
+        """ Sin cambios se responde 304 con una sola consulta de la partida """
+        etag = self.get_state()["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_state(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(len(queries.captured_queries), NOT_MODIFIED_QUERIES)
+
+    def test3(self):
+        """ Un movimiento o un cambio de estado cambian la ETag """
+        etag = self.get_state()["ETag"]
+        self.client1.post(reverse(MOVE_SERVICE), {"origin": 0, "target": 9})
+        response = self.get_state(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["cats"], [9, 2, 4, 6])
+
+        etag = response["ETag"]
+        Game.objects.filter(id=self.game.id).update(status=GameStatus.FINISHED)
+        self.assertEqual(self.get_state(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test4(self):
+        """ Sin partida seleccionada no hay estado """
+        session = self.client1.session
+        del session[constants.GAME_SELECTED_SESSION_ID]
+        session.save()
+        self.assertEqual(self.get_state().status_code, 404)
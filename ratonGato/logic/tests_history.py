@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from datamodel import archive, rules
+from datamodel.models import Game, GameStatus, Move
+
+from .tests_services import GameRequiredBaseServiceTests
+
+HISTORY_SERVICE = "history"
+
+
+@override_settings(HISTORY_PAGE_SIZE=3)
+class HistoryServiceTests(GameRequiredBaseServiceTests):
+    def setUp(self):
+        super().setUp()
+        self.finished = []
+        for i in range(8):
+            game = Game.objects.create(cat_user=self.user1, mouse_user=self.user2,
+                                       status=GameStatus.ACTIVE)
+            Move.objects.create(game=game, player=self.user1, origin=0, target=9)
+            Move.objects.create(game=game, player=self.user2, origin=59, target=50 + 2*(i % 2))
+            game.status = GameStatus.FINISHED
+            game.winner = rules.CAT
+            game.save()
+            self.finished.append(game.id)
+        # Las cuatro primeras pasan al archivo
+        Game.objects.filter(id__in=self.finished[:4]).update(
+            finished_at=timezone.now() - timedelta(days=60))
+        archive.archive_finished()
+        Game.objects.create(cat_user=self.user1, mouse_user=self.user2, status=GameStatus.ACTIVE)
+        Game.objects.create(cat_user=self.user2)
+
+    def tearDown(self):
+        super().tearDown()
+
+    def test1(self):
+        """ Solo puede invocarse por usuarios autenticados """
+        self.validate_login_required(self.client1, HISTORY_SERVICE)
+
+    def test2(self):
+        """ Paginacion por id de las partidas terminadas y archivadas """
+        self.loginTestUser(self.client2, self.user2)
+        games, params, queries = [], {}, set()
+        while True:
+            with CaptureQueriesContext(connection) as captured:
+                page = self.client2.get(reverse(HISTORY_SERVICE), params).json()
+            queries.add(len(captured))
+            self.assertLessEqual(len(page["games"]), 3)
+            games += page["games"]
+            if page["next"] is None:
+                break
+            params = {"before": page["next"]}
+
+        self.assertEqual([g["id"] for g in games], sorted(self.finished, reverse=True))
+        self.assertEqual([g["archived"] for g in games], [False]*4 + [True]*4)
+        # Sesion, usuario, partidas en uso, archivadas y movimientos
+        self.assertLessEqual(max(queries), 5)
+        for game in games:
+            i = self.finished.index(game["id"])
+            self.assertEqual(game["moves"], [[0, 9], [59, 50 + 2*(i % 2)]])
+            self.assertEqual((game["cat_user"], game["mouse_user"], game["winner"]),
+                             (self.user1.username, self.user2.username, rules.CAT))
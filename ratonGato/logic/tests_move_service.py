@@ -0,0 +1,83 @@
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from datamodel import constants
+from datamodel.models import Game, GameStatus, Move
+
+from .tests_services import PlayGameBaseServiceTests, MOVE_SERVICE
+
+# Consultas de un POST a move: sesion, usuario, SELECT ... FOR UPDATE de
+# la partida, UPDATE de la partida, INSERT del movimiento, comprobacion
+# de si el rival es el bot y guardado de la sesion (lectura de la base de
+# datos principal tras mover)
+MOVE_QUERIES = 7
+# Consultas de la redireccion a show_game: sesion, usuario y la partida
+# con sus dos jugadores
+SHOW_GAME_QUERIES = 3
+
+
+class MoveQueryBudgetTests(PlayGameBaseServiceTests):
+    def setUp(self):
+        super().setUp()
+        self.game = Game.objects.create(cat_user=self.user1,
+                                        mouse_user=self.user2,
+                                        status=GameStatus.ACTIVE)
+
+    def tearDown(self):
+        super().tearDown()
+
+    def select_game(self, client, user):
+        self.loginTestUser(client, user)
+        session = client.session
+        session[constants.GAME_SELECTED_SESSION_ID] = self.game.id
+        session.save()
+
+    def assertQueries(self, n, func, *args, **kwargs):
+        # Como assertNumQueries, sin contar el control de transacciones
+        # que solo algunos motores registran (BEGIN en SQLite)
+        with CaptureQueriesContext(connection) as queries:
+            result = func(*args, **kwargs)
+        sql = [q['sql'] for q in queries.captured_queries
+               if q['sql'] != 'BEGIN']
+        self.assertEqual(len(sql), n, "\n".join(sql))
+        return result
+
+    def test1(self):
+        """ Presupuesto de consultas de un movimiento y su redireccion """
+        self.select_game(self.client1, self.user1)
+        response = self.assertQueries(
+            MOVE_QUERIES, self.client1.post, reverse(MOVE_SERVICE),
+            {"origin": 0, "target": 9})
+        self.assertEqual(response.status_code, 302)
+        self.assertQueries(SHOW_GAME_QUERIES, self.client1.get, response.url)
+        self.assertEqual(Game.objects.get(id=self.game.id).cat1, 9)
+
+        self.select_game(self.client2, self.user2)
+        response = self.assertQueries(
+            MOVE_QUERIES, self.client2.post, reverse(MOVE_SERVICE),
+            {"origin": 59, "target": 50})
+        self.assertQueries(SHOW_GAME_QUERIES, self.client2.get, response.url)
+        self.assertEqual(Game.objects.get(id=self.game.id).mouse, 50)
+
+    def test2(self):
+        """ apply_move escribe partida y movimiento en la misma transaccion """
+        move = Game.objects.apply_move(self.game.id, self.user1.id, 0, 9)
+        self.assertEqual(move.game.cat1, 9)
+        self.assertFalse(move.game.cat_turn)
+        game = Game.objects.get(id=self.game.id)
+        self.assertEqual((game.cat1, game.move_count), (9, 1))
+        self.assertEqual(game.moves.get().id, move.id)
+
+    def test3(self):
+        """ Un movimiento rechazado no modifica la partida """
+        for user, origin, target in [(self.user2, 0, 9),
+                                     (self.user1, 0, 18),
+                                     (self.user1, 59, 50)]:
+            with self.assertRaises(ValidationError):
+                Game.objects.apply_move(self.game.id, user.id, origin, target)
+        game = Game.objects.get(id=self.game.id)
+        self.assertEqual(game.pos_gatos(), self.game.pos_gatos())
+        self.assertEqual(game.move_count, 0)
+        self.assertFalse(Move.objects.filter(game=game).exists())
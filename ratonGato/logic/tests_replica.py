@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connections
+from django.test import override_settings
+from django.urls import reverse
+
+from datamodel import constants
+from datamodel.models import Game, GameStatus
+from ratonGato import routers
+
+from .tests_services import PlayGameBaseServiceTests, MOVE_SERVICE, SELECT_GAME_SERVICE, SHOW_GAME_SERVICE
+
+REPLICA = "replica_test"
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRouterTests(PlayGameBaseServiceTests):
+    # La replica es un segundo fichero SQLite con las tablas migradas que
+    # no recibe escrituras, asi que siempre esta desfasada respecto a la
+    # base de datos principal
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        connections.databases[REPLICA] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.path.join(self.tmpdir, "replica.sqlite3"),
+        }
+        connections.ensure_defaults(REPLICA)
+        connections.prepare_test_settings(REPLICA)
+        call_command("migrate", database=REPLICA, verbosity=0)
+
+        self.game = Game.objects.create(cat_user=self.user1, mouse_user=self.user2,
+                                        status=GameStatus.ACTIVE)
+        # Copias de los usuarios y la partida en la replica
+        User.objects.using(REPLICA).bulk_create(
+            list(User.objects.filter(id__in=[self.user1.id, self.user2.id])))
+        Game.objects.using(REPLICA).bulk_create([Game.objects.get(id=self.game.id)])
+
+        self.loginTestUser(self.client1, self.user1)
+        session = self.client1.session
+        session[constants.GAME_SELECTED_SESSION_ID] = self.game.id
+        session.save()
+
+    def tearDown(self):
+        super().tearDown()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+        shutil.rmtree(self.tmpdir)
+
+    def test1(self):
+        """ Las vistas de lectura leen de la replica """
+        Game.objects.create(cat_user=self.user1, mouse_user=self.user2, status=GameStatus.ACTIVE)
+        response = self.client1.get(reverse(SELECT_GAME_SERVICE))
+        self.assertEqual([game.id for game in response.context["as_cat"]], [self.game.id])
+
+        # Fuera de esas vistas se lee de la principal
+        self.assertEqual(Game.objects.filter(cat_user=self.user1).count(), 2)
+        self.assertIsNone(routers.ReplicaRouter().db_for_read(Game))
+
+    def test2(self):
+        """ Tras un movimiento la sesion lee de la principal un tiempo """
+        self.client1.post(reverse(MOVE_SERVICE), {"origin": 0, "target": 9})
+        response = self.client1.get(reverse(SHOW_GAME_SERVICE))
+        self.assertEqual(response.context["game"].cat1, 9)
+
+        # Pasado ese tiempo vuelve a leer de la replica, aun desfasada
+        session = self.client1.session
+        session[constants.REPLICA_STICKY_SESSION_ID] = 0
+        session.save()
+        response = self.client1.get(reverse(SHOW_GAME_SERVICE))
+        self.assertEqual(response.context["game"].cat1, 0)
+        self.assertEqual(Game.objects.get(id=self.game.id).cat1, 9)
+
+    def test3(self):
+        """ Si falla la respuesta del bot, el movimiento ya hecho se lee de la principal """
+        with mock.patch("logic.views.bot.play", side_effect=ValidationError("Move not allowed")):
+            self.client1.post(reverse(MOVE_SERVICE), {"origin": 0, "target": 9})
+        response = self.client1.get(reverse(SHOW_GAME_SERVICE))
+        self.assertEqual(response.context["game"].cat1, 9)
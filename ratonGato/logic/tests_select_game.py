@@ -0,0 +1,69 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from datamodel.models import Game, GameStatus
+
+from .tests_services import GameRequiredBaseServiceTests, SELECT_GAME_SERVICE
+
+
+class SelectGameQueriesTests(GameRequiredBaseServiceTests):
+    def setUp(self):
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+
+    def create_games(self, n):
+        for _ in range(n):
+            Game.objects.create(cat_user=self.user1, mouse_user=self.user2,
+                                status=GameStatus.ACTIVE)
+            Game.objects.create(cat_user=self.user2, mouse_user=self.user1,
+                                status=GameStatus.ACTIVE)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client1.get(reverse(SELECT_GAME_SERVICE))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test1(self):
+        """ El listado cuesta las mismas consultas con 1 o con 10 partidas """
+        self.loginTestUser(self.client1, self.user1)
+        self.create_games(1)
+        few = self.count_queries()
+        self.create_games(9)
+        self.assertEqual(self.count_queries(), few)
+
+    @override_settings(SELECT_GAME_PAGE_SIZE=3)
+    def test2(self):
+        """ Paginacion por id: cada pagina continua donde acabo la anterior """
+        self.loginTestUser(self.client1, self.user1)
+        self.create_games(7)
+        expected = list(Game.objects.filter(cat_user=self.user1)
+                        .order_by('-id').values_list('id', flat=True))
+
+        seen = []
+        params = {}
+        while True:
+            response = self.client1.get(reverse(SELECT_GAME_SERVICE), params)
+            seen += [game.id for game in response.context['as_cat']]
+            if response.context['next_cat'] is None:
+                break
+            self.assertIn('cat_before=%d' % response.context['next_cat'],
+                          self.decode(response.content))
+            params = {'cat_before': response.context['next_cat']}
+        self.assertEqual(seen, expected)
+
+    def test3(self):
+        """ La seleccion directa de una partida es una unica consulta """
+        game = Game.objects.create(cat_user=self.user1, mouse_user=self.user2,
+                                   status=GameStatus.ACTIVE)
+        self.loginTestUser(self.client1, self.user1)
+        with CaptureQueriesContext(connection) as queries:
+            self.client1.get(reverse(SELECT_GAME_SERVICE,
+                                     kwargs={'game_id': game.id}))
+        game_queries = [q for q in queries.captured_queries
+                        if 'datamodel_game' in q['sql']]
+        self.assertEqual(len(game_queries), 1)
@@ -0,0 +1,88 @@
+import threading
+import time
+
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+
+from datamodel import constants, notifications
+from datamodel.models import Game, GameStatus
+from datamodel.tests_concurrency import retry_locked
+
+from .tests_services import PlayGameBaseServiceTests, MOVE_SERVICE
+
+WAIT_MOVE_SERVICE = "wait_move"
+
+
+@override_settings(LONG_POLL_TIMEOUT=0.2)
+class WaitMoveServiceTests(PlayGameBaseServiceTests):
+    def setUp(self):
+        super().setUp()
+        self.game = Game.objects.create(cat_user=self.user1,
+                                        mouse_user=self.user2,
+                                        status=GameStatus.ACTIVE)
+        self.set_game_in_session(self.client1, self.user1, self.game.id)
+        self.set_game_in_session(self.client2, self.user2, self.game.id)
+
+    def tearDown(self):
+        super().tearDown()
+
+    def wait_move(self, client, move_count):
+        return client.get(reverse(WAIT_MOVE_SERVICE),
+                          {"move_count": move_count})
+
+    def test1(self):
+        """ Si la partida ya tiene mas movimientos se responde al momento """
+        self.client1.post(reverse(MOVE_SERVICE), {"origin": 0, "target": 9})
+        response = self.wait_move(self.client2, 0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"move_count": 1, "cat_turn": False,
+                                           "status": GameStatus.ACTIVE})
+
+    def test2(self):
+        """ Sin movimientos del rival se responde 204 al vencer el tiempo """
+        start = time.perf_counter()
+        response = self.wait_move(self.client2, 0)
+        self.assertEqual(response.status_code, 204)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.2)
+        self.assertEqual(notifications._channels, {})
+
+    @override_settings(LONG_POLL_TIMEOUT=10)
+    def test3(self):
+        """ El movimiento del rival despierta la espera """
+        responses = []
+
+        def wait():
+            try:
+                responses.append(retry_locked(lambda _: self.wait_move(self.client2, 0), None))
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=wait)
+        start = time.perf_counter()
+        thread.start()
+        while self.game.id not in notifications._channels:
+            time.sleep(0.001)
+        # SQLite bloquea la tabla si coincide con la lectura de la espera
+        retry_locked(lambda _: self.client1.post(reverse(MOVE_SERVICE), {"origin": 0, "target": 9}),
+                     None)
+        thread.join()
+
+        self.assertLess(time.perf_counter() - start, 10)
+        self.assertEqual(responses[0].status_code, 200)
+        self.assertEqual(responses[0].json()["move_count"], 1)
+
+    def test4(self):
+        """ Sin partida seleccionada o sin move_count no se espera """
+        self.assertEqual(self.wait_move(self.client2, "x").status_code, 404)
+        session = self.client1.session
+        del session[constants.GAME_SELECTED_SESSION_ID]
+        session.save()
+        self.assertEqual(self.wait_move(self.client1, 0).status_code, 404)
+
+    def test5(self):
+        """ La pagina espera el movimiento solo en el turno del rival """
+        response = self.client2.get(reverse("show_game"))
+        self.assertIn(reverse(WAIT_MOVE_SERVICE), self.decode(response.content))
+        response = self.client1.get(reverse("show_game"))
+        self.assertNotIn(reverse(WAIT_MOVE_SERVICE), self.decode(response.content))
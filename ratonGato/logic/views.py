@@ -1,12 +1,21 @@
-from django.http import HttpResponseForbidden
+import json
+import time
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import (HttpResponse, HttpResponseForbidden, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import render, redirect
 from django.urls import reverse
+from django.views.decorators.http import condition
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
-from datamodel import constants
-from datamodel.models import Counter, Game, GameStatus, Move
+from datamodel import (bot, cleanup, constants, history, notifications,
+                       pubsub)
+from datamodel.models import Counter, Game, GameStatus
+from ratonGato.routers import read_from_replica, stick_to_primary
+from logic import board_cache
 from logic.forms import MoveForm, SignupForm, UserLoginForm
-from operator import attrgetter
 from django.http import HttpResponseNotFound
 from django.core.exceptions import ValidationError
 
@@ -23,6 +32,16 @@ def anonymous_required(f):
     return wrapped
 
 
+def staff_required(f):
+    def wrapped(request, *args, **kwargs):
+        if not request.user.is_staff:
+            return HttpResponseForbidden(
+                errorHTTP(request,
+                          exception="Action restricted to staff users"))
+        return f(request, *args, **kwargs)
+    return wrapped
+
+
 def errorHTTP(request, exception=None):
     context_dict = {}
     context_dict[constants.ERROR_MESSAGE_ID] = exception
@@ -101,77 +120,242 @@ def create_game_service(request):
 
 
 @login_required
-def join_game_service(request):
-    gamelist = []
-    gamelisttemp = Game.objects.all()
-    for game in gamelisttemp:
-        if (game.mouse_user is None) and (game.cat_user != request.user):
-            gamelist.append(game)
+def create_bot_game_service(request, side):
+    # The user plays the given side and the bot takes the other one
+    bot_user = bot.get_bot_user()
+    if side == 'cat':
+        game = Game(cat_user=request.user, mouse_user=bot_user)
+    elif side == 'mouse':
+        game = Game(cat_user=bot_user, mouse_user=request.user)
+    else:
+        return HttpResponseNotFound("Not Found")
+    game.full_clean()
+    game.save()
+
+    # The cats move first
+    bot.play(game)
+    stick_to_primary(request)
+
+    request.session[constants.GAME_SELECTED_SESSION_ID] = game.id
+    return redirect(reverse('show_game'))
 
-    if not gamelist:
+
+@login_required
+def join_game_service(request):
+    # Claim the newest open game with a conditional UPDATE
+    readygame = Game.objects.claim_open_game(request.user)
+    if readygame is None:
         return render(request, 'mouse_cat/join_game.html',
                       {'msg_error': "There is no available games"})
 
-    readygame = max(gamelist, key=attrgetter('id'))
-    readygame.mouse_user = request.user
-    readygame.full_clean()
-    readygame.save()
+    stick_to_primary(request)
     return render(request, 'mouse_cat/join_game.html', {'game': readygame})
 
 
 @login_required
-def select_game_service(request, game_id=-1):
-    as_mouse = []
-    as_cat = []
+@staff_required
+def clean_db_service(request):
+    # GET asks for confirmation; POST deletes unjoined games past their
+    # time to live, in short chunks
+    if request.method == 'POST':
+        n_games, elapsed = cleanup.delete_orphan_games()
+        return render(request, 'mouse_cat/clean_db.html',
+                      {'n_games': n_games, 'elapsed': elapsed})
+    n_orphans = cleanup.orphan_games(cleanup.cutoff()).count()
+    return render(request, 'mouse_cat/clean_db.html',
+                  {'n_orphans': n_orphans})
+
 
-    gamelist = Game.objects.all()
-    for game in gamelist:
-        if game.status == GameStatus.ACTIVE:
-            if (game.mouse_user == request.user):
-                as_mouse.append(game)
-            elif (game.cat_user == request.user):
-                as_cat.append(game)
+def cursor_param(request, name):
+    # Id from which a keyset page starts, or None if missing or malformed
+    try:
+        return int(request.GET[name])
+    except (KeyError, ValueError):
+        return None
 
+
+@login_required
+@read_from_replica
+def select_game_service(request, game_id=-1):
     if game_id != -1:
-        for game in gamelist:
-            if game.id == game_id:
-                if game.status == GameStatus.ACTIVE:
-                    if (game.mouse_user == request.user):
-                        tag = constants.GAME_SELECTED_SESSION_ID
-                        request.session[tag] = game_id
-                        return redirect(reverse('index'))
-                    elif (game.cat_user == request.user):
-                        tag = constants.GAME_SELECTED_SESSION_ID
-                        request.session[tag] = game_id
-                        return redirect(reverse('index'))	
-                    else:
-                        return HttpResponseNotFound("Not Found")
-                else:
-                    return HttpResponseNotFound("Not Found")
-        return HttpResponseNotFound("Not Found")
+        # Single indexed lookup: the game must be active and ours
+        playing = (Game.objects.filter(id=game_id, status=GameStatus.ACTIVE)
+                   .filter(Q(cat_user=request.user) |
+                           Q(mouse_user=request.user))
+                   .exists())
+        if not playing:
+            return HttpResponseNotFound("Not Found")
+        request.session[constants.GAME_SELECTED_SESSION_ID] = game_id
+        return redirect(reverse('index'))
+
+    # One query per side, whatever the number of games in the table
+    size = settings.SELECT_GAME_PAGE_SIZE
+    cat_before = cursor_param(request, 'cat_before')
+    mouse_before = cursor_param(request, 'mouse_before')
+    as_cat, next_cat = Game.objects.keyset_page(
+        Game.objects.active_as_cat(request.user), cat_before, size)
+    as_mouse, next_mouse = Game.objects.keyset_page(
+        Game.objects.active_as_mouse(request.user), mouse_before, size)
 
     return render(request, 'mouse_cat/select_game.html',
-                  {'as_cat': as_cat, 'as_mouse': as_mouse})
+                  {'as_cat': as_cat, 'as_mouse': as_mouse,
+                   'next_cat': next_cat, 'next_mouse': next_mouse,
+                   'cat_before': cat_before, 'mouse_before': mouse_before})
+
+
+@login_required
+@read_from_replica
+def history_service(request):
+    # JSON page of finished and archived games, newest first
+    page = history.page(request.user, cursor_param(request, 'before'),
+                        settings.HISTORY_PAGE_SIZE)
+    return JsonResponse(page)
 
 
 @login_required
+@read_from_replica
 def show_game_service(request):
     if constants.GAME_SELECTED_SESSION_ID not in request.session:
         print('Error')
         return HttpResponseNotFound("Not Found")
     else:
         game_id = request.session[constants.GAME_SELECTED_SESSION_ID]
-        game = Game.objects.get(id=game_id)
-        board = [0]*64
-        cats = game.pos_gatos()
-
-        for c in cats:
-            board[c] = 1
-        board[game.pos_raton()[0]] = -1
+        game = (Game.objects.select_related('cat_user', 'mouse_user')
+                .get(id=game_id))
         moveform = MoveForm()
+        # The page long-polls wait_move while it is the opponent's turn
+        waiting_id = game.mouse_user_id if game.cat_turn else game.cat_user_id
+        waiting = (game.status == GameStatus.ACTIVE
+                   and waiting_id == request.user.id)
         return render(request, 'mouse_cat/game.html',
-                      {'game': game, 'board': board,
-                       'move_form': moveform})
+                      {'game': game,
+                       'board_html': board_cache.render_board(game),
+                       'move_form': moveform, 'waiting': waiting})
+
+
+def game_state_etag(request):
+    # (id, move count, status) identifies a game state; one query by pk
+    game_id = request.session.get(constants.GAME_SELECTED_SESSION_ID)
+    if game_id is None:
+        return None
+    row = (Game.objects.filter(id=game_id)
+           .values_list('move_count', 'status').first())
+    if row is None:
+        return None
+    return '"%d-%d-%d"' % (game_id, row[0], row[1])
+
+
+@login_required
+@read_from_replica
+@condition(etag_func=game_state_etag)
+def game_state_service(request):
+    # JSON state of the selected game; unchanged states get a 304 from
+    # the condition decorator without loading the game
+    game_id = request.session.get(constants.GAME_SELECTED_SESSION_ID)
+    game = Game.objects.filter(id=game_id).first()
+    if game is None:
+        return HttpResponseNotFound("Not Found")
+    response = JsonResponse(game.event())
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+def wait_move_service(request):
+    # Long poll: answer as soon as the selected game has more moves than
+    # the client knows of, or with 204 after LONG_POLL_TIMEOUT seconds
+    if constants.GAME_SELECTED_SESSION_ID not in request.session:
+        return HttpResponseNotFound("Not Found")
+    known = cursor_param(request, 'move_count')
+    if known is None:
+        return HttpResponseNotFound("Not Found")
+    game_id = request.session[constants.GAME_SELECTED_SESSION_ID]
+    games = Game.objects.filter(id=game_id).values('move_count', 'cat_turn',
+                                                   'status')
+
+    def changed(game):
+        return (game['move_count'] > known
+                or game['status'] != GameStatus.ACTIVE)
+
+    with notifications.listen(game_id) as channel:
+        game = games.first()
+        if game is None:
+            return HttpResponseNotFound("Not Found")
+        if not changed(game):
+            # Move.save only wakes waits of its own process; moves made
+            # by other processes are seen by the read after the timeout
+            channel.wait(known, settings.LONG_POLL_TIMEOUT)
+            game = games.first()
+
+    if not changed(game):
+        return HttpResponse(status=204)
+    return JsonResponse(game)
+
+
+def sse(event, name='state'):
+    return 'id: %d\nevent: %s\ndata: %s\n\n' % (
+        event['move'], name, json.dumps(event, separators=(',', ':')))
+
+
+def game_events(game_id, last_move):
+    # Sends the current state and then every move published for the
+    # game, until it finishes or SSE_STREAM_SECONDS pass (EventSource
+    # reconnects on its own, sending the last id as Last-Event-ID).
+    # The subscription lives in the generator so closing the response,
+    # even before it is iterated, never leaves it open; it is taken
+    # before reading the game so no move is lost in between
+    channel = Game.channel(game_id)
+    with pubsub.subscribe(channel) as subscription:
+        game = Game.objects.filter(id=game_id).first()
+        if game is None:
+            return
+        event = game.event()
+        if event['status'] != GameStatus.ACTIVE:
+            # Nothing else will be published; drop what subscribing to a
+            # finished game may have created
+            pubsub.discard(channel)
+        yield 'retry: %d\n\n' % settings.SSE_RETRY_MS
+        if event['move'] > last_move:
+            yield sse(event)
+            last_move = event['move']
+        deadline = time.monotonic() + settings.SSE_STREAM_SECONDS
+        while event['status'] == GameStatus.ACTIVE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            message = subscription.get(min(settings.SSE_KEEPALIVE_SECONDS,
+                                           remaining))
+            if message is None:
+                yield ': keepalive\n\n'
+                continue
+            event = json.loads(message)
+            if event['move'] > last_move:
+                yield sse(event)
+                last_move = event['move']
+
+
+@login_required
+def game_events_service(request, game_id):
+    # Server-Sent Events stream of a game for players and spectators.
+    # Each stream holds a server thread for up to SSE_STREAM_SECONDS
+    try:
+        last_move = int(request.META.get('HTTP_LAST_EVENT_ID', -1))
+    except ValueError:
+        last_move = -1
+    if not Game.objects.filter(id=game_id).exists():
+        return HttpResponseNotFound("Not Found")
+    response = StreamingHttpResponse(game_events(game_id, last_move),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx-like proxies not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+def metrics_service(request):
+    # Counters of this process
+    return JsonResponse({'board_cache': board_cache.stats()})
 
 
 @login_required
@@ -184,11 +368,17 @@ def move_service(request):
 
             if moveform.is_valid():
                 game_id = request.session[constants.GAME_SELECTED_SESSION_ID]
-                game = Game.objects.get(id=game_id)
                 try:
-                    Move.objects.create(game=game, player=request.user,
-                                        origin=moveform.cleaned_data['origin'],
-                                        target=moveform.cleaned_data['target'])
+                    # Lock, validate and write game and move in one go
+                    move = Game.objects.apply_move(
+                        game_id, request.user.id,
+                        moveform.cleaned_data['origin'],
+                        moveform.cleaned_data['target'])
+                    # Our next reads must see this move, even if the
+                    # bot's reply fails
+                    stick_to_primary(request)
+                    # Reply straight away if the opponent is the bot
+                    bot.play(move.game)
                 except ValidationError:
                     print('Error en el movimiento')
                 finally:
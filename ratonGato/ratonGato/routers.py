@@ -0,0 +1,59 @@
+"""Database router sending the reads of some views to read replicas.
+
+Replica aliases are listed in settings.DATABASE_REPLICAS. Reads only go to
+a replica inside a view wrapped with ``read_from_replica``; everything
+else, and every write, uses the ``default`` (primary) database. After a
+write, ``stick_to_primary`` keeps the session on the primary for
+REPLICA_STICKY_SECONDS, so users always see their own moves even if the
+replicas lag behind.
+"""
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+
+from datamodel import constants
+
+_local = threading.local()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if getattr(_local, 'replica', None):
+            return _local.replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primary and replicas hold the same data
+        return True
+
+
+def stick_to_primary(request):
+    request.session[constants.REPLICA_STICKY_SESSION_ID] = (
+        time.time() + settings.REPLICA_STICKY_SECONDS)
+
+
+def is_sticky(request):
+    until = request.session.get(constants.REPLICA_STICKY_SESSION_ID)
+    return until is not None and time.time() < until
+
+
+def read_from_replica(view):
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or is_sticky(request):
+            return view(request, *args, **kwargs)
+
+        previous = getattr(_local, 'replica', None)
+        _local.replica = random.choice(replicas)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _local.replica = previous
+    return wrapped
@@ -28,11 +28,18 @@ urlpatterns = [
     path('logout/', views.logout_service, name='logout'),
     path('counter/', views.counter_service, name='counter'),
     path('create_game/', views.create_game_service, name='create_game'),
+    path('create_bot_game/<str:side>', views.create_bot_game_service, name='create_bot_game'),
     path('join_game/', views.join_game_service, name='join_game'),
+    path('clean_db/', views.clean_db_service, name='clean_db'),
     path('select_game/', views.select_game_service, name='select_game'),
     path('select_game/<int:game_id>', views.select_game_service, name='select_game'),
     path('show_game/', views.show_game_service, name='show_game'),
+    path('game_state/', views.game_state_service, name='game_state'),
+    path('history/', views.history_service, name='history'),
+    path('metrics/', views.metrics_service, name='metrics'),
     path('move/', views.move_service, name='move'),
+    path('wait_move/', views.wait_move_service, name='wait_move'),
+    path('game_events/<int:game_id>', views.game_events_service, name='game_events'),
 
 
 ]